@@ -2,52 +2,162 @@ import pygame
 import sys
 import subprocess
 import os
+import argparse
+import importlib
+import multiprocessing
+import queue
+from time import perf_counter, sleep
 
-# Initialize Pygame
-pygame.init()
+SIMULATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pendulum_simulation")
+sys.path.insert(0, SIMULATION_DIR)  # The modes import each other as top-level modules
 
-# Screen dimensions
-WIDTH, HEIGHT = 800, 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Pendulum Control - Main Menu")
+# Screen dimensions, the same as the simulation windows (commons.WIDTH, HEIGHT) so the modes reuse the menu's surface
+WIDTH, HEIGHT = 900, 600
+CAPTION = "Pendulum Control - Main Menu"
 
 # Colors
 BACKGROUND = (240, 240, 240)
 BUTTON_COLOR = (70, 130, 180)
 BUTTON_HOVER = (100, 160, 210)
+BUTTON_DISABLED = (150, 160, 170)
 TEXT_COLOR = (255, 255, 255)
 TITLE_COLOR = (50, 50, 50)
 
-# Fonts
-title_font = pygame.font.SysFont("Arial", 64, bold=True)
-button_font = pygame.font.SysFont("Arial", 33)
-info_font = pygame.font.SysFont("Arial", 24)
-
 class Button:
     def __init__(self, text, x, y, width=300, height=72):
         self.rect = pygame.Rect(x, y, width, height)
         self.text = text
         self.is_hovered = False
-        
-    def draw(self, surface):
-        color = BUTTON_HOVER if self.is_hovered else BUTTON_COLOR
+        self.enabled = True
+
+    def draw(self, surface, font):
+        color = BUTTON_DISABLED if not self.enabled else BUTTON_HOVER if self.is_hovered else BUTTON_COLOR
         pygame.draw.rect(surface, color, self.rect, border_radius=12)
         pygame.draw.rect(surface, (50, 50, 50), self.rect, 3, border_radius=12)
-        
-        text_surf = button_font.render(self.text, True, TEXT_COLOR)
+
+        text_surf = font.render(self.text, True, TEXT_COLOR)
         text_rect = text_surf.get_rect(center=self.rect.center)
         surface.blit(text_surf, text_rect)
-        
+
     def check_hover(self, pos):
         self.is_hovered = self.rect.collidepoint(pos)
-        
+
     def is_clicked(self, pos, event):
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+        if self.enabled and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             return self.rect.collidepoint(pos)
         return False
 
-def main():
-    current_script_dir = os.path.dirname(os.path.abspath(__file__))
+def run_mode(module_name, screen, **options):
+    """
+    Runs the `main` of a mode module on the menu's surface, in this process. The module, with pymunk, neat and
+    whatever else it needs, is only imported on first use, and stays imported for the next launch.
+    """
+    module = importlib.import_module(module_name)
+    module.main(window=screen, **options)
+    pygame.display.set_caption(CAPTION)
+
+def _train(progress):
+    """Body of the training process: runs `train.run` with its default settings and reports progress to the menu."""
+    import neat
+    import train
+
+    class ProgressReporter(neat.reporting.BaseReporter):
+        def start_generation(self, generation):
+            self.generation = generation
+            progress.put(f"Training: generation {generation}")
+
+        def post_evaluate(self, config, population, species, best_genome):
+            progress.put(f"Training: generation {self.generation}, best fitness {best_genome.fitness:.2f}")
+
+    train.run(os.path.join(SIMULATION_DIR, 'neat_config.txt'), os.path.join(SIMULATION_DIR, 'best_network.pkl'),
+              trajectory_path=os.path.join(SIMULATION_DIR, 'trajectories'),
+              controller_path=os.path.join(SIMULATION_DIR, 'best_controller.py'), reporters=[ProgressReporter()])
+    progress.put("Training finished, best network saved")
+
+class TrainingWorker:
+    """
+    Training in a background process, so the menu stays responsive and the other modes can run meanwhile.
+    The process is spawned rather than forked, so it never shares the menu's SDL state.
+    """
+    def __init__(self):
+        context = multiprocessing.get_context("spawn")
+        self.progress = context.Queue()
+        self.process = context.Process(target=_train, args=(self.progress,))
+        self.process.start()
+        self.status = "Starting training..."
+
+    def running(self):
+        """Updates `status` with the newest progress message and tells whether the training is still going."""
+        try:
+            while True:
+                self.status = self.progress.get_nowait()
+        except queue.Empty:
+            pass
+        return self.process.is_alive()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+def measure_startup(screen, repeats=3):
+    """
+    Prints how long each mode takes to start, as a subprocess like the menu used to launch them and in-process.
+    For the demonstrations that is the time to their first frame, in-process the first launch includes importing
+    the mode and the next ones do not. For training it is the time until the first generation starts, and how
+    long the menu itself is blocked.
+    """
+    print(f"{'mode':<16} {'path':<22} {'startup':>10}")
+    for label, module_name in (("AI Control", "AI_control"), ("Manual Control", "manual_control")):
+        code = f"import sys; sys.path.insert(0, {SIMULATION_DIR!r}); import {module_name}; {module_name}.main(max_frames=1)"
+        timings = []
+        for _ in range(repeats):
+            start = perf_counter()
+            subprocess.run([sys.executable, "-c", code], capture_output=True, check=True)
+            timings.append(perf_counter() - start)
+        print(f"{label:<16} {'subprocess':<22} {min(timings):>8.3f} s")
+        for launch in ("in-process, first", "in-process, next"):
+            start = perf_counter()
+            run_mode(module_name, screen, max_frames=1)
+            print(f"{label:<16} {launch:<22} {perf_counter() - start:>8.3f} s")
+
+    # The old path blocks the menu until training ends, the first generation starts after `startup`
+    start = perf_counter()
+    child = subprocess.Popen([sys.executable, "-u", os.path.join(SIMULATION_DIR, "train.py")], stdout=subprocess.PIPE, text=True)
+    for line in child.stdout:
+        if "Running generation" in line:
+            break
+    print(f"{'Training':<16} {'subprocess':<22} {perf_counter() - start:>8.3f} s  (menu blocked until training ends)")
+    child.kill()
+    child.wait()
+
+    start = perf_counter()
+    worker = TrainingWorker()
+    blocked = perf_counter() - start
+    while True:
+        alive = worker.running()
+        if worker.status.startswith("Training: generation"):
+            break
+        if not alive:
+            sys.exit(f"Training process exited with code {worker.process.exitcode} before its first generation")
+        sleep(0.01)  # Polling more often only takes CPU time from the training process being measured
+    print(f"{'Training':<16} {'background process':<22} {perf_counter() - start:>8.3f} s  (menu blocked {blocked * 1000:.0f} ms)")
+    worker.stop()
+
+def main(measure=False):
+    # Initialize Pygame
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption(CAPTION)
+
+    if measure:
+        measure_startup(screen)
+        pygame.quit()
+        return
+
+    # Fonts
+    title_font = pygame.font.SysFont("Arial", 64, bold=True)
+    button_font = pygame.font.SysFont("Arial", 33)
+    info_font = pygame.font.SysFont("Arial", 24)
 
     # Create buttons
     train_button = Button("Train Neural Network", WIDTH//2 - 150, HEIGHT//2 - 105)
@@ -55,69 +165,83 @@ def main():
     manual_control_button = Button("Manual Control", WIDTH//2 - 150, HEIGHT//2 + 65)
     quit_button = Button("Quit", WIDTH//2 - 150, HEIGHT//2 + 150)
     buttons = [train_button, ai_control_button, manual_control_button, quit_button]
-    
+
     clock = pygame.time.Clock()
+    training = None
+    status = "Choose an option from the menu above"
     running = True
-    
+
     while running:
         mouse_pos = pygame.mouse.get_pos()
-        
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-                
+
             if train_button.is_clicked(mouse_pos, event):
                 print("Starting training...")
                 try:
-                    # Run the training script
-                    subprocess.run([sys.executable, os.path.join(current_script_dir, "pendulum_simulation", "train.py")])
+                    training = TrainingWorker()
                 except Exception as e:
                     print(f"Error running trainer: {e}")
-                    
+
             if ai_control_button.is_clicked(mouse_pos, event):
                 print("Starting demonstration...")
                 try:
-                    # Run the demonstration script
-                    subprocess.run([sys.executable, os.path.join(current_script_dir, "pendulum_simulation", "AI_control.py")])
+                    run_mode("AI_control", screen)
                 except Exception as e:
                     print(f"Error running demonstrator: {e}")
-            
+
             if manual_control_button.is_clicked(mouse_pos, event):
                 print("Starting demonstration...")
                 try:
-                    subprocess.run([sys.executable, os.path.join(current_script_dir, "pendulum_simulation", "manual_control.py")])
+                    run_mode("manual_control", screen)
                 except Exception as e:
                     print(f"Error running demonstrator: {e}")
-                    
+
             if quit_button.is_clicked(mouse_pos, event):
                 running = False
-        
+
+        # Training runs on in the background, one at a time
+        if training is not None:
+            training_running = training.running()
+            status = training.status
+            train_button.enabled = not training_running
+            if not training_running:
+                training = None
+
         # Update button hover states
         for b in buttons:
             b.check_hover(mouse_pos)
-        
+
         # Draw everything
         screen.fill(BACKGROUND)
-        
+
         # Draw title
         title_text = title_font.render("Pendulum Simulation", True, TITLE_COLOR)
         title_rect = title_text.get_rect(center=(WIDTH//2, 100))
         screen.blit(title_text, title_rect)
-        
+
         # Draw buttons
         for b in buttons:
-            b.draw(screen)
-        
+            b.draw(screen, button_font)
+
         # Draw info text
-        info_text = info_font.render("Choose an option from the menu above", True, (100, 100, 100))
+        info_text = info_font.render(status, True, (100, 100, 100))
         info_rect = info_text.get_rect(center=(WIDTH//2, HEIGHT - 50))
         screen.blit(info_text, info_rect)
-        
+
         pygame.display.flip()
         clock.tick(60)
-    
+
     pygame.quit()
+    if training is not None and training.running():
+        print("Training continues in the background, the best network is saved when it ends")
     sys.exit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pendulum simulation launcher")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="print how long each mode takes to start, as a subprocess and in-process, then exit")
+    args = parser.parse_args()
+    main(measure=args.measure_startup)
@@ -1,15 +1,19 @@
 import pygame
 import pymunk
-import pymunk.pygame_util
 import pickle
-import neat
 import os
-from commons import Pendulum, WIDTH, HEIGHT
+import argparse
+from typing import TYPE_CHECKING
+from commons import PHYSICS_SUBSTEPS, FixedStepLoop, Pendulum, WIDTH, HEIGHT, draw_pendulum, step_physics
+from export_controller import load_controller
+
+if TYPE_CHECKING:
+    import neat  # Only for the annotations, neat is imported when a network is loaded
 
 # Configuration
-FPS = 60
+FPS = 60  # Frames drawn per second at most, the controller runs at commons.CONTROL_RATE whatever this is
 
-def print_network(genome: neat.DefaultGenome):
+def print_network(genome: "neat.DefaultGenome"):
     """
     Sources: 
         - https://neat-python.readthedocs.io/en/latest/_modules/genes.html
@@ -32,6 +36,8 @@ def print_network(genome: neat.DefaultGenome):
     
 def load_trained_network(network_path, config_path):
     """Load the trained network from disk"""
+    import neat
+
     # Load the NEAT config
     config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
                                 neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
@@ -46,48 +52,96 @@ def load_trained_network(network_path, config_path):
     print(f"Loaded trained network with fitness: {winner.fitness}")
     return network, winner
 
-def main():
+def main(record=False, replay=False, window=None, max_frames=None, fps=FPS, substeps=PHYSICS_SUBSTEPS):
+    """
+    With `record`, the episode is appended to the trajectory log. With `replay`, the last recorded episode is
+    played back from the log instead, without simulating anything.
+    With a `window`, the demonstration draws on that display surface and leaves pygame initialised when it returns,
+    otherwise it opens its own window. `max_frames` ends it after that many frames.
+    The pendulum is stepped like in training, `substeps` physics steps per control tick, and drawn at `fps` frames
+    per second at most.
+    """
+    local_dir = os.path.dirname(__file__) # This is always the same location (relative to your script)
+    trajectory_path = os.path.join(local_dir, 'trajectories')
+
+    if replay:
+        if not os.path.exists(os.path.join(trajectory_path, 'meta.json')):
+            print(f"Error: no recorded episodes found at {trajectory_path}")
+            print("Run with --record first")
+            return
+        from replay import play
+        from trajectory_log import TrajectoryLog
+        own_window = window is None
+        if own_window:
+            pygame.init()
+            window = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Trained Pendulum - Replay")
+        play(window, pygame.time.Clock(), TrajectoryLog(trajectory_path))
+        if own_window:
+            pygame.quit()
+        return
+
     # Initialize Pygame
-    pygame.init()
-    window = pygame.display.set_mode((WIDTH, HEIGHT))
+    own_window = window is None
+    if own_window:
+        pygame.init()
+        window = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Trained Pendulum - Neural Network Control")
     clock = pygame.time.Clock()
     
     # Set up physics space
     space = pymunk.Space()
     space.gravity = (0, 981)
-    draw_options = pymunk.pygame_util.DrawOptions(window)
     
     # Load the trained network
-    local_dir = os.path.dirname(__file__) # This is always the same location (relative to your script)
     network_path = os.path.join(local_dir, 'best_network.pkl')
     config_path = os.path.join(local_dir, 'neat_config.txt')
+    controller_path = os.path.join(local_dir, 'best_controller.py')
     
     if not os.path.exists(network_path):
         print(f"Error: Trained network file not found at {network_path}")
         print("Please run the training program first to generate best_network.pkl")
         return
     
-    try:
-        network, winner_genome = load_trained_network(network_path, config_path)
-    except Exception as e:
-        print(f"Error loading network: {e}")
-        return
-    
-    print_network(winner_genome)
+    # The exported controller, when it matches best_network.pkl, runs without neat
+    controller = load_controller(controller_path, network_path)
+    if controller is not None:
+        activate = controller.activate
+        fitness = controller.FITNESS
+        print(f"Loaded exported controller '{os.path.basename(controller_path)}' with fitness: {fitness}")
+    else:
+        try:
+            network, winner_genome = load_trained_network(network_path, config_path)
+        except Exception as e:
+            print(f"Error loading network: {e}")
+            return
+        print_network(winner_genome)
+        print("Run export_controller.py to export it as a standalone controller")
+        activate = network.activate
+        fitness = winner_genome.fitness
     
     # Create the pendulum
     pendulum = Pendulum(space)
     
     # Font for displaying information
     font = pygame.font.SysFont("Arial", 24)
+
+    writer = None
+    if record:
+        from trajectory_log import TrajectoryWriter
+        writer = TrajectoryWriter(trajectory_path)
+        writer.begin_episode("AI_control", fitness=fitness)
     
     print("Simulation running... Press ESC or close window to exit.")
     
+    loop = FixedStepLoop()
+    previous_positions = pendulum.positions()
+    sensory_data = pendulum.get_sensory_data()
+    move_speed = 0
+    step = 0
+    frames = 0
     running = True
     while running:
-        dt = 1.0 / FPS
-        
         # Handle events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -96,31 +150,39 @@ def main():
                 if event.key == pygame.K_ESCAPE:
                     running = False
         
-        # Get sensory data from pendulum
-        sensory_data = pendulum.get_sensory_data()
-        
-        # Use the neural network to control the pendulum
-        neural_net_output = network.activate(sensory_data)
-        move_speed = neural_net_output[0] * 5  # Same scaling as in training
-        
-        # Apply the movement to the pendulum pivot
-        pendulum.pivot_body.velocity = (move_speed, 0)
-        pendulum.pivot_body.position = (
-            max(WIDTH/6, min(WIDTH - WIDTH/6, pendulum.pivot_body.position.x + move_speed)),
-            pendulum.pivot_body.position.y
-        )
-        
-        # Step the physics simulation
-        space.step(dt)
+        # Run the control ticks due since the last frame
+        for _ in range(loop.ticks()):
+            previous_positions = pendulum.positions()
+
+            # Get sensory data from pendulum
+            sensory_data = pendulum.get_sensory_data()
+
+            # Use the neural network to control the pendulum
+            neural_net_output = activate(sensory_data)
+            move_speed = neural_net_output[0] * 5  # Same scaling as in training
+
+            # Apply the movement to the pendulum pivot
+            pendulum.pivot_body.velocity = (move_speed, 0)
+            pendulum.pivot_body.position = (
+                max(WIDTH/6, min(WIDTH - WIDTH/6, pendulum.pivot_body.position.x + move_speed)),
+                pendulum.pivot_body.position.y
+            )
+
+            # Step the physics simulation
+            step_physics(space, loop.dt, substeps)
+            if writer is not None:
+                writer.append(step, pendulum, sensory_data, neural_net_output[0])
+            step += 1
         
-        # Draw everything
+        # Draw everything, between the last two ticks
         window.fill((240, 240, 240))  # Light gray background
-        space.debug_draw(draw_options)
+        pivot, bob = loop.interpolate(previous_positions, pendulum.positions())
+        draw_pendulum(window, pivot, bob)
         
         # Display information
         pivot_x, angle, angular_vel = sensory_data
         info_text = [
-            f"Fitness: {winner_genome.fitness:.2f}",
+            f"Fitness: {fitness:.2f}",
             f"Pivot X: {pivot_x:.2f}",
             f"Angle: {angle:.2f}",
             f"Angular Velocity: {angular_vel:.2f}",
@@ -133,10 +195,24 @@ def main():
             window.blit(text_surface, (10, 10 + i * 25))
         
         pygame.display.update()
-        clock.tick(FPS)
+        clock.tick(fps)
+        frames += 1
+        if max_frames is not None and frames >= max_frames:
+            running = False
     
-    pygame.quit()
+    if writer is not None:
+        writer.end_episode()
+        print(f"Episode of {step} steps recorded to '{trajectory_path}'")
+    if own_window:
+        pygame.quit()
     print("Simulation ended.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Watch the trained network balance the pendulum")
+    parser.add_argument("--record", action="store_true", help="append the episode to the trajectory log")
+    parser.add_argument("--replay", action="store_true", help="play the last recorded episode back instead of simulating")
+    parser.add_argument("--fps", type=int, default=FPS, help="frames drawn per second at most (default: %(default)s)")
+    parser.add_argument("--substeps", type=int, default=PHYSICS_SUBSTEPS,
+                        help="physics steps per control tick, as in training (default: %(default)s)")
+    args = parser.parse_args()
+    main(record=args.record, replay=args.replay, fps=args.fps, substeps=args.substeps)
\ No newline at end of file
@@ -0,0 +1,106 @@
+import numpy as np
+import neat
+
+# NumPy versions of the activation functions in neat.activations, with the same scaling and clamping
+ACTIVATIONS = {
+    "sigmoid": lambda z: 1.0 / (1.0 + np.exp(-np.clip(5.0 * z, -60.0, 60.0))),
+    "tanh": lambda z: np.tanh(np.clip(2.5 * z, -60.0, 60.0)),
+    "sin": lambda z: np.sin(np.clip(5.0 * z, -60.0, 60.0)),
+    "relu": lambda z: np.maximum(z, 0.0),
+    "identity": lambda z: z,
+    "clamped": lambda z: np.clip(z, -1.0, 1.0),
+    "abs": np.abs,
+    "square": lambda z: z ** 2,
+}
+
+class BatchedFeedForwardNetwork:
+    """
+    All the feed-forward phenotypes of a generation compiled into padded NumPy tensors, so that one `activate`
+    call evaluates the whole population.
+
+    Every network gets the same slot layout for its node values: the inputs first, then the outputs, then its
+    hidden nodes. A node's layer is one more than the deepest node feeding it, and for every layer there is a
+    (pop_size, slots, slots) weight tensor plus biases and responses. Layer by layer, each node computes
+    act(bias + response * sum(weights * values)) exactly like `neat.nn.FeedForwardNetwork.activate`, so the
+    results agree up to floating-point summation order. Nodes that neat leaves out of the phenotype (the outputs
+    of a network with no path from the inputs, for example) stay at 0.0, as they do in neat.
+    """
+    def __init__(self, num_inputs, num_outputs, weights, biases, responses, layer_masks, activation_masks):
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        self.weights = weights                    # (layers, pop_size, slots, slots), [layer, genome, to, from]
+        self.biases = biases                      # (layers, pop_size, slots)
+        self.responses = responses                # (layers, pop_size, slots)
+        self.layer_masks = layer_masks            # (layers, pop_size, slots), True for the nodes computed in a layer
+        self.activation_masks = activation_masks  # {activation name: (pop_size, slots) mask}
+
+    @staticmethod
+    def create(genomes, config):
+        """Receives the genomes of a population and returns their phenotypes as one `BatchedFeedForwardNetwork`."""
+        return BatchedFeedForwardNetwork.from_networks(
+            [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes], config)
+
+    @staticmethod
+    def from_networks(neural_nets, config):
+        """Compiles already created `neat.nn.FeedForwardNetwork` phenotypes."""
+        genome_config = config.genome_config
+        activation_names = {genome_config.activation_defs.get(name): name for name in genome_config.activation_options}
+        activation_names[genome_config.activation_defs.get(genome_config.activation_default)] = genome_config.activation_default
+        sum_function = genome_config.aggregation_function_defs.get("sum")
+
+        num_inputs = len(genome_config.input_keys)
+        num_outputs = len(genome_config.output_keys)
+        pop_size = len(neural_nets)
+
+        # Slot and layer of every evaluated node, per network
+        layouts = []
+        for net in neural_nets:
+            slots = {key: i for i, key in enumerate(net.input_nodes + net.output_nodes)}
+            depths = {key: 0 for key in net.input_nodes}
+            for node, act_func, agg_func, bias, response, links in net.node_evals:
+                if agg_func is not sum_function:
+                    raise ValueError("BatchedFeedForwardNetwork only supports the 'sum' aggregation")
+                if activation_names.get(act_func) not in ACTIVATIONS:
+                    raise ValueError(f"BatchedFeedForwardNetwork does not support the activation of node {node}")
+                slots.setdefault(node, len(slots))
+                depths[node] = 1 + max((depths[i] for i, w in links), default=0)
+            layouts.append((slots, depths))
+
+        num_slots = max([len(slots) for slots, depths in layouts], default=num_inputs + num_outputs)
+        num_layers = max([max(depths.values()) for slots, depths in layouts], default=0)
+
+        weights = np.zeros((num_layers, pop_size, num_slots, num_slots))
+        biases = np.zeros((num_layers, pop_size, num_slots))
+        responses = np.zeros((num_layers, pop_size, num_slots))
+        layer_masks = np.zeros((num_layers, pop_size, num_slots), dtype=bool)
+        activation_masks = {}
+
+        for g, (net, (slots, depths)) in enumerate(zip(neural_nets, layouts)):
+            for node, act_func, agg_func, bias, response, links in net.node_evals:
+                layer = depths[node] - 1
+                slot = slots[node]
+                for i, w in links:
+                    weights[layer, g, slot, slots[i]] += w
+                biases[layer, g, slot] = bias
+                responses[layer, g, slot] = response
+                layer_masks[layer, g, slot] = True
+                name = activation_names[act_func]
+                if name not in activation_masks:
+                    activation_masks[name] = np.zeros((pop_size, num_slots), dtype=bool)
+                activation_masks[name][g, slot] = True
+
+        return BatchedFeedForwardNetwork(num_inputs, num_outputs, weights, biases, responses, layer_masks, activation_masks)
+
+    def activate(self, inputs):
+        """Takes a (pop_size, num_inputs) array, one row per genome, and returns the (pop_size, num_outputs) outputs."""
+        inputs = np.asarray(inputs, dtype=float)
+        values = np.zeros(self.layer_masks.shape[1:])
+        values[:, :self.num_inputs] = inputs
+
+        for weights, biases, responses, layer_mask in zip(self.weights, self.biases, self.responses, self.layer_masks):
+            z = biases + responses * np.einsum('gts,gs->gt', weights, values)
+            for name, activation_mask in self.activation_masks.items():
+                mask = layer_mask & activation_mask
+                values[mask] = ACTIVATIONS[name](z[mask])
+
+        return values[:, self.num_inputs:self.num_inputs + self.num_outputs]
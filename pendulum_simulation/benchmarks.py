@@ -0,0 +1,320 @@
+"""
+Headless benchmarks of the simulation and training hot paths.
+
+    python benchmarks.py                          # run everything, write benchmark_results.json
+    python benchmarks.py --quick                  # fewer repeats and a shorter training generation
+    python benchmarks.py --compare baseline.json  # also flag regressions against a stored result file
+
+Every benchmark reports the per-call latency and the calls per second (for the physics, one call is one step).
+Nothing is displayed: pygame, if it gets imported at all, uses the SDL dummy video driver.
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+import math
+import pickle
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import pymunk
+import neat
+import train
+import export_controller
+from commons import SOLVER_ITERATIONS, WIDTH, Pendulum, make_space
+
+def measure(function, calls, repeats):
+    """Best time per call of `function` over `repeats` rounds of `calls` calls, in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+def result(seconds_per_call, **details):
+    return {"latency_us": seconds_per_call * 1e6, "calls_per_sec": 1 / seconds_per_call, **details}
+
+def new_space(pendulum_count, collision_shape=True, iterations=SOLVER_ITERATIONS):
+    space = make_space(iterations)
+    pendulums = [Pendulum(space, collision_shape) for _ in range(pendulum_count)]
+    for i, pendulum in enumerate(pendulums):
+        pendulum.bob_body.velocity = (50 + i % 7, 0)  # Keep the pendulums swinging
+    return space, pendulums
+
+def bench_pendulum_init(repeats):
+    space = pymunk.Space()
+    def create():
+        pendulum = Pendulum(space)
+        space.remove(*pendulum.everything_in_space)
+    return result(measure(create, 1000, repeats))
+
+def bench_sensors(repeats):
+    space, (pendulum,) = new_space(1)
+    space.step(1 / 60)
+    return {
+        "get_angular_velocity": result(measure(pendulum.get_angular_velocity, 20000, repeats)),
+        "get_sensory_data": result(measure(pendulum.get_sensory_data, 20000, repeats)),
+    }
+
+def bench_space_step(repeats):
+    results = {}
+    for pendulum_count in (1, 100, 1000):
+        space, pendulums = new_space(pendulum_count)
+        calls = max(10, 20000 // pendulum_count)
+        seconds = measure(lambda: space.step(1 / 60), calls, repeats)
+        results[f"space.step[{pendulum_count}]"] = result(seconds, pendulum_steps_per_sec=pendulum_count / seconds)
+    return results
+
+# Pendulums with collision shapes in a default space, as the interactive modes build them, then as training does
+PHYSICS_VARIANTS = (("full", True, SOLVER_ITERATIONS), ("lite", False, SOLVER_ITERATIONS), ("lite, 1 iteration", False, 1))
+
+def swing(space, pendulums, steps):
+    """Steps `space` while moving every pivot back and forth at its own pace, returns the bob positions."""
+    for step in range(steps):
+        for i, pendulum in enumerate(pendulums):
+            move_speed = 5 * math.sin(step * 0.01 * (i + 1))
+            pendulum.pivot_body.velocity = (move_speed, 0)
+            pendulum.pivot_body.position = (
+                max(WIDTH/6, min(WIDTH - WIDTH/6, pendulum.pivot_body.position.x + move_speed)),
+                pendulum.pivot_body.position.y
+            )
+        space.step(1 / 60)
+    return [tuple(pendulum.bob_body.position) for pendulum in pendulums]
+
+def bench_physics_lite(population_sizes, repeats):
+    """
+    `space.step` for a whole training population in one space, with collision shapes (every bob overlaps all the
+    others in the broadphase, which grows with the square of the population), without them (PHYSICS_LITE), and
+    without them in a single-iteration space. `max_deviation_px` is how far each variant's bobs end up from the full
+    simulation's after a 25 s episode of 100 pendulums driven by their pivots.
+    """
+    deviations = {}
+    reference = None
+    for name, collision_shape, iterations in PHYSICS_VARIANTS:
+        positions = swing(*new_space(100, collision_shape, iterations), 1500)
+        reference = reference or positions
+        deviations[name] = max(max(abs(x - x0), abs(y - y0)) for (x, y), (x0, y0) in zip(positions, reference))
+
+    results = {}
+    for pendulum_count in population_sizes:
+        full = None
+        for name, collision_shape, iterations in PHYSICS_VARIANTS:
+            space, pendulums = new_space(pendulum_count, collision_shape, iterations)
+            if collision_shape:
+                # A single step of 10000 pendulums with shapes takes seconds
+                calls = max(1, 2_000_000 // pendulum_count**2)
+                rounds = repeats if pendulum_count <= 1000 else 1
+            else:
+                calls, rounds = max(3, 20000 // pendulum_count), repeats
+            seconds = measure(lambda: space.step(1 / 60), calls, rounds)
+            full = full or seconds
+            results[f"physics[{name}, {pendulum_count}]"] = result(seconds, pendulum_steps_per_sec=pendulum_count / seconds,
+                                                                  speedup=full / seconds, max_deviation_px=deviations[name])
+    return results
+
+def bench_episode_setup(repeats):
+    """Getting a population of pendulums into a space for an episode and out of it again, new ones versus the pool."""
+    results = {}
+    pool_setting = train.PENDULUM_POOL
+    for pool in (False, True):
+        train.PENDULUM_POOL = pool
+        for pendulum_count in (100, 1000, 5000):
+            space = pymunk.Space()
+            def episode():
+                pendulums = train.take_pendulums(space, pendulum_count)
+                train.release_pendulums(space, pendulums)
+            seconds = measure(episode, 3, repeats)
+            name = "pool" if pool else "new"
+            results[f"episode setup[{name}, {pendulum_count}]"] = result(seconds, per_pendulum_us=seconds / pendulum_count * 1e6)
+    train.PENDULUM_POOL = pool_setting
+    return results
+
+def bench_activate(config, repeats):
+    """`FeedForwardNetwork.activate` on networks grown to more and more hidden nodes."""
+    results = {}
+    random.seed(0)
+    genome = config.genome_type(0)
+    genome.configure_new(config.genome_config)
+    hidden_nodes = 0
+    for target in (0, 5, 20, 50):
+        while hidden_nodes < target:
+            genome.mutate_add_node(config.genome_config)
+            genome.mutate_add_connection(config.genome_config)
+            hidden_nodes = len(genome.nodes) - len(config.genome_config.output_keys)
+        network = neat.nn.FeedForwardNetwork.create(genome, config)
+        inputs = (0.1, -0.5, 0.3)
+        seconds = measure(lambda: network.activate(inputs), 5000, repeats)
+        results[f"activate[{target} hidden]"] = result(seconds, evaluated_nodes=len(network.node_evals))
+    return results
+
+# Loading a controller in a fresh interpreter, like AI_control.py does, printing the seconds it took
+NEAT_LOAD = """
+import time; start = time.perf_counter()
+import pickle, neat
+config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                            neat.DefaultSpeciesSet, neat.DefaultStagnation, {config!r})
+with open({network!r}, 'rb') as input_file:
+    neat.nn.FeedForwardNetwork.create(pickle.load(input_file), config)
+print(time.perf_counter() - start)
+"""
+EXPORTED_LOAD = """
+import time; start = time.perf_counter()
+from export_controller import load_controller
+load_controller({controller!r}, {network!r})
+print(time.perf_counter() - start)
+"""
+
+def bench_controller(config, repeats):
+    """
+    The exported controller against `neat.nn.FeedForwardNetwork`: time per `activate` call for the shipped
+    best_network.pkl and for a genome grown to 20 hidden nodes, and the time to load each in a fresh interpreter.
+    """
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    network_path = os.path.join(local_dir, 'best_network.pkl')
+    config_path = os.path.join(local_dir, 'neat_config.txt')
+    with open(network_path, 'rb') as input_file:
+        shipped = pickle.load(input_file)
+    random.seed(0)
+    grown = config.genome_type(0)
+    grown.configure_new(config.genome_config)
+    while len(grown.nodes) - len(config.genome_config.output_keys) < 20:
+        grown.mutate_add_node(config.genome_config)
+        grown.mutate_add_connection(config.genome_config)
+    grown.fitness = 0.0
+
+    results = {}
+    inputs = (0.1, -0.5, 0.3)
+    for name, genome in (("best_network", shipped), ("20 hidden", grown)):
+        network = neat.nn.FeedForwardNetwork.create(genome, config)
+        namespace = {}
+        exec(export_controller.generate_source(genome, config), namespace)
+        results[f"controller activate[neat, {name}]"] = result(measure(lambda: network.activate(inputs), 5000, repeats))
+        results[f"controller activate[exported, {name}]"] = result(measure(lambda: namespace["activate"](inputs), 5000, repeats))
+
+    with tempfile.TemporaryDirectory() as directory:
+        controller_path = os.path.join(directory, 'best_controller.py')
+        export_controller.export(network_path, config_path, controller_path)
+        for name, code in (("neat", NEAT_LOAD.format(network=network_path, config=config_path)),
+                           ("exported", EXPORTED_LOAD.format(controller=controller_path, network=network_path))):
+            seconds = min(float(subprocess.run([sys.executable, "-c", code], cwd=local_dir, capture_output=True,
+                                               text=True, check=True).stdout.split()[-1]) for _ in range(repeats))
+            results[f"controller load[{name}]"] = result(seconds)
+    return results
+
+def bench_generation(config, sim_time):
+    """One full `train.fitness_function` call on a fresh population of the shipped configuration."""
+    random.seed(0)
+    train.total_sim_time = sim_time
+    train.genome_cache = None
+    train.racing = None
+    population = list(neat.Population(config).population.items())
+    start = time.perf_counter()
+    train.fitness_function(population, config)
+    seconds = time.perf_counter() - start
+    steps = int(sim_time / (1 / 60))
+    return result(seconds, pop_size=len(population), steps=steps, pendulum_steps_per_sec=len(population) * steps / seconds)
+
+def bench_scenarios(config, sim_time):
+    """
+    One `train.fitness_function` call scoring every genome on 1, 4 and 8 scenarios in the same pass, for the pymunk
+    backend and for the NumPy backend with batched networks, compared with running the single scenario that many times.
+    """
+    results = {}
+    settings = (train.total_sim_time, train.BACKEND, train.BATCH_NETWORKS, train.scenario_count)
+    train.total_sim_time = sim_time
+    train.genome_cache = None
+    train.racing = None
+    random.seed(0)
+    population = list(neat.Population(config).population.items())
+    for backend, batch_networks in (("pymunk", False), ("numpy", True)):
+        train.BACKEND = backend
+        train.BATCH_NETWORKS = batch_networks
+        single = None
+        for scenario_count in (1, 4, 8):
+            train.scenario_count = scenario_count
+            start = time.perf_counter()
+            train.fitness_function(population, config)
+            seconds = time.perf_counter() - start
+            single = single or seconds
+            results[f"scenarios[{backend}, {scenario_count}]"] = result(seconds, pop_size=len(population),
+                                                                        versus_sequential=seconds / (scenario_count * single))
+    train.total_sim_time, train.BACKEND, train.BATCH_NETWORKS, train.scenario_count = settings
+    return results
+
+def run_benchmarks(quick=False):
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                neat.DefaultSpeciesSet, neat.DefaultStagnation, os.path.join(local_dir, 'neat_config.txt'))
+    repeats = 3 if quick else 7
+
+    results = {"Pendulum.__init__": bench_pendulum_init(repeats)}
+    results.update(bench_sensors(repeats))
+    results.update(bench_space_step(repeats))
+    results.update(bench_episode_setup(repeats))
+    results.update(bench_physics_lite((100, 1000) if quick else (100, 1000, 3000, 10000), repeats))
+    results.update(bench_activate(config, repeats))
+    results.update(bench_controller(config, repeats))
+    results[f"fitness_function[{train.BACKEND}]"] = bench_generation(config, 5 if quick else train.total_sim_time)
+    results.update(bench_scenarios(config, 2 if quick else 5))
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "pymunk": pymunk.version,
+            "machine": platform.machine(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+def compare(current, baseline, tolerance):
+    """Prints the change of every benchmark against `baseline` and returns the names of those slower than `tolerance`."""
+    regressions = []
+    for name, values in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            print(f"{name:<32} {values['latency_us']:>12.2f} us  (new)")
+            continue
+        change = values["latency_us"] / reference["latency_us"] - 1
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<32} {values['latency_us']:>12.2f} us  {change:+7.1%}{flag}")
+    return regressions
+
+def main():
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Benchmark the simulation and training hot paths")
+    parser.add_argument("--output", default=os.path.join(local_dir, "benchmark_results.json"),
+                        help="where to write the results (default: %(default)s)")
+    parser.add_argument("--compare", metavar="BASELINE", help="result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="slowdown flagged as a regression when comparing (default: %(default)s)")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and a 5 s training episode")
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.quick)
+    with open(args.output, "w") as output:
+        json.dump(current, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as input_file:
+            baseline = json.load(input_file)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for name, values in current["results"].items():
+            print(f"{name:<32} {values['latency_us']:>12.2f} us  {values['calls_per_sec']:>12.1f} /s")
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""Pendulum controller exported by export_controller.py, do not edit."""
+import math
+
+SOURCE_DIGEST = '25a9af92ed4c0e5a57772ca26f1a6f74'
+FITNESS = 22.996610393966133
+
+def activate(inputs):
+    input1, input2, input3, = inputs
+    node0 = math.tanh(max(-60.0, min(60.0, 2.5 * (1.4277366836011378 + 1.0 * (0.0 + input2 * 2.8001948886097514 + input3 * 1.3352519975694257 + input1 * 0.17736438301560425)))))
+    return [node0]
@@ -0,0 +1,65 @@
+"""
+Wall-clock budgeted training: generations run one at a time for as long as the next one is expected to finish
+before the deadline, instead of for a fixed number of generations.
+
+    python train.py --time-budget 3600   # an hour, whatever the generation count
+"""
+from collections import deque
+from time import perf_counter
+
+class TimeBudget:
+    """
+    A deadline `seconds` from now, and the wall-clock durations of the last `window` generations (or, for runs that
+    advance several generations at a time, of the last `window` such steps, per generation).
+    The next generation is expected to take as long as the slowest of them: generations get slower as the genomes
+    grow, and an estimate that runs over the deadline costs more than one that leaves a little time unused.
+    """
+    def __init__(self, seconds, window=5):
+        self.seconds = seconds
+        self.deadline = perf_counter() + seconds
+        self.durations = deque(maxlen=window)
+
+    def remaining(self):
+        return self.deadline - perf_counter()
+
+    def estimate(self):
+        """Expected seconds of the next generation, None before the first one."""
+        return max(self.durations) if self.durations else None
+
+    def next_generation_fits(self):
+        """The first generation always runs, so there is a best genome whatever the budget."""
+        return self.generations_that_fit(1) > 0
+
+    def generations_that_fit(self, limit):
+        """How many of the next `limit` generations are expected to finish in time, all of them before the first."""
+        estimate = self.estimate()
+        if estimate is None:
+            return limit
+        if estimate <= 0:
+            return limit if self.remaining() > 0 else 0
+        return max(0, min(limit, int(self.remaining() // estimate)))
+
+    def record(self, seconds, generations=1):
+        self.durations.append(seconds / generations)
+
+    def stop_message(self, last_generation):
+        return (f"Time budget: stopping after generation {last_generation}, the next one would take about "
+                f"{self.estimate():.1f} sec and {max(self.remaining(), 0):.1f} sec of {self.seconds:.0f} are left")
+
+def run_until_deadline(population, fitness_function, budget):
+    """
+    Runs `population` a generation at a time while the next one fits in `budget`, or until the fitness threshold is
+    reached, and returns the best genome so far. A generation is never cut short, so every reporter, checkpoints
+    included, sees complete generations only.
+    """
+    while budget.next_generation_fits():
+        generation = population.generation
+        start = perf_counter()
+        population.run(fitness_function, 1)
+        budget.record(perf_counter() - start)
+        # Population.run stops before creating the next generation, and counting it, when the threshold is reached
+        if population.generation == generation:
+            return population.best_genome
+
+    print("\n" + budget.stop_message(population.generation - 1))
+    return population.best_genome
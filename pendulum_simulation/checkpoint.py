@@ -0,0 +1,179 @@
+import os
+import pickle
+import queue
+import random
+import struct
+import threading
+import zlib
+from itertools import count
+import neat
+
+MAGIC = b"PNDLCKPT"
+FORMAT_VERSION = 1
+
+def _peek(indexer):
+    """Next value of an `itertools.count` and a fresh counter that still starts at it, since counters can't be read."""
+    value = next(indexer)
+    return value, count(value)
+
+def capture_state(population, extra_state=None):
+    """
+    Everything `neat.Population.run` needs to continue exactly where it is, as a picklable dict: the genomes,
+    the species with their stagnation history, the genome, species and node indexers, the ancestry, the best
+    genome so far and the state of `random`. `extra_state` holds whatever the caller wants restored with it.
+    """
+    reproduction = population.reproduction
+    species_set = population.species
+    genome_config = population.config.genome_config
+
+    next_genome_key, reproduction.genome_indexer = _peek(reproduction.genome_indexer)
+    next_species_key, species_set.indexer = _peek(species_set.indexer)
+    next_node_key = None
+    if genome_config.node_indexer is not None:
+        next_node_key, genome_config.node_indexer = _peek(genome_config.node_indexer)
+
+    return {
+        "generation": population.generation,
+        "population": population.population,
+        "species": species_set.species,
+        "genome_to_species": species_set.genome_to_species,
+        "best_genome": population.best_genome,
+        "ancestors": reproduction.ancestors,
+        "next_genome_key": next_genome_key,
+        "next_species_key": next_species_key,
+        "next_node_key": next_node_key,
+        "random_state": random.getstate(),
+        "extra_state": extra_state or {},
+    }
+
+def encode(pickled_state):
+    """Versioned binary format: magic, format version, then the zlib compressed pickle of the state."""
+    return MAGIC + struct.pack("<H", FORMAT_VERSION) + zlib.compress(pickled_state, 6)
+
+def decode(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a pendulum training checkpoint")
+    version, = struct.unpack_from("<H", data, len(MAGIC))
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format version {version}, expected {FORMAT_VERSION}")
+    return pickle.loads(zlib.decompress(data[len(MAGIC) + 2:]))
+
+def write_atomically(path, data):
+    """Writes `data` next to `path` and renames it into place, so `path` always holds a complete file."""
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'wb') as output:
+        output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temporary_path, path)
+
+def restore_population(path, config):
+    """
+    Rebuilds the `neat.Population` saved in the checkpoint at `path`, using `config` (which must be the configuration
+    of the checkpointed run), and restores the state of `random`. Returns the population and the extra state.
+    """
+    with open(path, 'rb') as input_file:
+        state = decode(input_file.read())
+
+    population = neat.Population(config, initial_state=(state["population"], None, state["generation"]))
+    species_set = config.species_set_type(config.species_set_config, population.reporters)
+    species_set.species = state["species"]
+    species_set.genome_to_species = state["genome_to_species"]
+    species_set.indexer = count(state["next_species_key"])
+    population.species = species_set
+
+    population.reproduction.genome_indexer = count(state["next_genome_key"])
+    population.reproduction.ancestors = state["ancestors"]
+    if state["next_node_key"] is not None:
+        config.genome_config.node_indexer = count(state["next_node_key"])
+    population.best_genome = state["best_genome"]
+
+    random.setstate(state["random_state"])
+    return population, state["extra_state"]
+
+class Checkpointer(neat.reporting.BaseReporter):
+    """
+    Saves the full state of a population every `generation_interval` generations, once the next generation has been
+    created. The state is pickled in the training thread, then compressed and written by a background thread, so
+    evaluation never waits for the disk. If the writer falls behind, only the newest pending checkpoint is kept.
+    `extra_state` is a callable returning a dict of additional picklable state to store with every checkpoint.
+    An error that stops the writer is raised again by the next checkpoint and by `close`.
+    """
+    def __init__(self, population, path, generation_interval=1, extra_state=None):
+        self.population = population
+        self.path = path
+        self.generation_interval = generation_interval
+        self.extra_state = extra_state
+        self.pending = queue.Queue(maxsize=1)
+        self.error = None
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def end_generation(self, config, population, species_set):
+        # Population.run increments its generation right after this call, the checkpoint resumes at that generation
+        generation = self.population.generation + 1
+        if generation % self.generation_interval != 0:
+            return
+        if self.error is not None:
+            raise self.error
+        state = capture_state(self.population, self.extra_state() if self.extra_state else None)
+        state["generation"] = generation
+        self._submit(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+
+    def _submit(self, item):
+        while True:
+            try:
+                self.pending.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.pending.get_nowait()  # Replace the checkpoint that was not written yet
+                except queue.Empty:
+                    pass
+
+    def _write_loop(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            try:
+                write_atomically(self.path, encode(item))
+            except Exception as error:
+                self.error = error
+                return
+
+    def close(self):
+        """Waits until the last checkpoint is on disk and stops the writer, then raises the error that stopped it."""
+        # A writer that died leaves its queue full, only wait for room while it can still make some
+        while self.writer.is_alive():
+            try:
+                self.pending.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self.writer.join()
+        if self.error is not None:
+            raise self.error
+
+class BestGenomeExporter(neat.reporting.BaseReporter):
+    """
+    Saves the best genome so far to `path` as soon as a generation improves on it, so a long run always has a usable
+    controller on disk. The file is replaced atomically: readers get the previous genome or the new one, never a
+    partial pickle. `export` is called with `path` after every save, `best_fitness` is the fitness to beat.
+    """
+    def __init__(self, path, export=None, best_fitness=None):
+        self.path = path
+        self.export = export
+        self.best_fitness = best_fitness
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.offer(best_genome)
+
+    def offer(self, genome):
+        """Saves `genome` if it is fitter than the best one saved, for callers that are not a population's reporter."""
+        if self.best_fitness is not None and genome.fitness <= self.best_fitness:
+            return
+        self.best_fitness = genome.fitness
+        write_atomically(self.path, pickle.dumps(genome, 1))
+        if self.export is not None:
+            self.export(self.path)
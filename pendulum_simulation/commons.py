@@ -1,24 +1,108 @@
 import pymunk
 import math
+import numpy as np
+from time import perf_counter
 
 WIDTH, HEIGHT = 900, 600
 
+# Stepping shared by training and the interactive modes, so a controller sees the same dynamics in both
+CONTROL_RATE = 60  # Control ticks per second of simulated time: the sensors are read and the pivot moved once per tick
+PHYSICS_SUBSTEPS = 1  # Physics steps per control tick
+
+BOB_MASS = 20
+BOB_RADIUS = 20
+
+SOLVER_ITERATIONS = 10  # pymunk's default
+
+def make_space(iterations=SOLVER_ITERATIONS):
+    """
+    A space with the gravity of every simulation. Each bob only hangs from a kinematic pivot, so the first solver
+    iteration already satisfies its pin joint and the others only repeat it: 1 iteration halves the cost of a
+    shape-less `space.step`, but rounds differently, so results drift apart from the default ones over an episode.
+    """
+    space = pymunk.Space()
+    space.gravity = (0, 981)
+    space.iterations = iterations
+    return space
+
+def step_physics(space, dt, substeps=PHYSICS_SUBSTEPS):
+    """Advances `space` (or a `PendulumBatch`) by one control tick of `dt` seconds, in `substeps` equal steps."""
+    substep_dt = dt / substeps
+    for _ in range(substeps):
+        space.step(substep_dt)
+
+class FixedStepLoop:
+    """
+    Fixed-timestep loop for the interactive modes. Wall-clock time accumulates between frames and is spent in
+    control ticks of exactly `1 / control_rate` seconds, so the simulation is the same at any frame rate.
+    When a frame takes too long, the next one runs several ticks (the frames in between are skipped), at most
+    `max_ticks_per_frame`, and the time beyond that is dropped so a stall slows the simulation down instead of
+    making it catch up forever. `alpha` tells how far the wall clock is between the last tick and the next one,
+    for drawing the state interpolated between the last two ticks.
+    """
+    def __init__(self, control_rate=CONTROL_RATE, max_ticks_per_frame=5):
+        self.dt = 1 / control_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.accumulator = 0.0
+        self.last_time = None
+        self.skipped_frames = 0  # Ticks run without a frame drawn after them
+        self.dropped_time = 0.0  # Seconds of wall-clock time not simulated
+
+    def ticks(self):
+        """Number of control ticks to run before drawing the next frame."""
+        now = perf_counter()
+        if self.last_time is not None:
+            self.accumulator += now - self.last_time
+        self.last_time = now
+
+        due = int(self.accumulator / self.dt)
+        self.accumulator -= due * self.dt
+        ticks = min(due, self.max_ticks_per_frame)
+        self.dropped_time += (due - ticks) * self.dt
+        self.skipped_frames += max(0, ticks - 1)
+        return ticks
+
+    @property
+    def alpha(self):
+        return min(1.0, self.accumulator / self.dt)
+
+    def interpolate(self, previous, current):
+        """Points between the `previous` and `current` ones (sequences of (x, y) points) at `alpha`."""
+        alpha = self.alpha
+        return [(x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha) for (x0, y0), (x1, y1) in zip(previous, current)]
+
+def draw_pendulum(surface, pivot, bob, color=(70, 130, 180)):
+    """Draws a pendulum, its cord, bob and pivot, at the given positions."""
+    import pygame  # Only the interactive modes draw, training never loads pygame
+
+    pygame.draw.line(surface, (80, 80, 80), pivot, bob, 2)
+    pygame.draw.circle(surface, color, bob, 20)
+    pygame.draw.circle(surface, (50, 50, 50), pivot, 4)
+
 class Pendulum:
-    def __init__(self, space):
+    def __init__(self, space, collision_shape=True):
+        """
+        Without `collision_shape`, the bob is a body given the mass and moment its circle would have, and no shape:
+        it moves the same, but the space has nothing to put in its broadphase. Training needs no more.
+        """
         # Create anchor body as KINEMATIC so we can control its position
         self.pivot_body = pymunk.Body(body_type=pymunk.Body.KINEMATIC)
         self.pivot_body.position = (WIDTH/2, HEIGHT/2)
 
-        self.bob_body = pymunk.Body() # The weighted object at the end of the pendulum
+        shapes = []
+        if collision_shape:
+            self.bob_body = pymunk.Body() # The weighted object at the end of the pendulum
+            circle_shape = pymunk.Circle(self.bob_body, BOB_RADIUS, (0, 0))
+            circle_shape.friction = 1
+            circle_shape.mass = BOB_MASS
+            circle_shape.elasticity = 0.95
+            shape_filter = pymunk.ShapeFilter(group=1) # Make sure pendulums don't collide with each other
+            circle_shape.filter = shape_filter
+            shapes.append(circle_shape)
+        else:
+            self.bob_body = pymunk.Body(BOB_MASS, pymunk.moment_for_circle(BOB_MASS, 0, BOB_RADIUS))
         self.bob_body.position = (self.pivot_body.position.x, self.pivot_body.position.y + 100)
-        circle_shape = pymunk.Circle(self.bob_body, 20, (0, 0))
-        circle_shape.friction = 1
-        circle_shape.mass = 20
-        circle_shape.elasticity = 0.95
         suspension = pymunk.PinJoint(self.bob_body, self.pivot_body, (0, 0), (0, 0)) # The cord that holds the bob and suspends it from a fixed point
-
-        shape_filter = pymunk.ShapeFilter(group=1) # Make sure pendulums don't collide with each other
-        circle_shape.filter = shape_filter
         
         # Calculate pendulum length
         self.pendulum_length = math.sqrt(
@@ -26,9 +110,38 @@ class Pendulum:
             (self.bob_body.position.y - self.pivot_body.position.y)**2
         )
 
-        self.everything_in_space = [circle_shape, self.bob_body, suspension]
+        self.suspension = suspension
+        self.everything_in_space = shapes + [self.bob_body, suspension]
         space.add(*self.everything_in_space)
 
+    def reset(self):
+        """
+        Puts the pendulum back in the state it was created in, reusing its bodies and shape, if any.
+        The pin joint is replaced because the solver warm starts every step with the impulse it accumulated on a joint,
+        so a fresh one guarantees that nothing of the previous episode carries over into the next.
+        """
+        self.pivot_body.position = (WIDTH/2, HEIGHT/2)
+        self.pivot_body.velocity = (0, 0)
+
+        self.bob_body.position = (self.pivot_body.position.x, self.pivot_body.position.y + 100)
+        self.bob_body.velocity = (0, 0)
+        self.bob_body.angle = 0
+        self.bob_body.angular_velocity = 0
+        self.bob_body.force = (0, 0)
+        self.bob_body.torque = 0
+
+        suspension = pymunk.PinJoint(self.bob_body, self.pivot_body, (0, 0), (0, 0))
+        space = self.bob_body.space
+        if space is not None:
+            space.remove(self.suspension)
+            space.add(suspension)
+        self.suspension = suspension
+        self.everything_in_space[-1] = suspension
+
+    def positions(self):
+        """Pivot and bob positions, as plain (x, y) tuples."""
+        return tuple(self.pivot_body.position), tuple(self.bob_body.position)
+
     def get_angular_velocity(self):
         # Calculate tangential velocity (component perpendicular to the pendulum arm)
         dx = self.bob_body.position.x - self.pivot_body.position.x
@@ -70,4 +183,83 @@ class Pendulum:
         normalized_angular_velocity = self.get_angular_velocity() / math.pi  # Scale down
         
         return normalized_pivot_x, normalized_angle, normalized_angular_velocity
-  
\ No newline at end of file
+
+    @staticmethod
+    def get_sensory_data_batch(pendulums):
+        """Sensory data of several pendulums as a (len(pendulums), 3) array, one `get_sensory_data` row per pendulum."""
+        return np.array([pendulum.get_sensory_data() for pendulum in pendulums]).reshape(len(pendulums), 3)
+  
+
+class PendulumBatch:
+    """
+    A whole population of pendulums held in NumPy arrays instead of pymunk bodies.
+    The pivots are kinematic and every bob is pinned to its pivot, as in `Pendulum`. Each call to `step` follows
+    the order of `pymunk.Space.step`: integrate positions, integrate velocities under gravity, then solve the pin
+    joint with pymunk's default error correction. The bobs never interact, so there is nothing else to simulate.
+    """
+    def __init__(self, count, gravity=981, error_bias=pow(1 - 0.1, 60)):
+        self.count = count
+        self.gravity = gravity
+        self.error_bias = error_bias # Same meaning and default as pymunk.Constraint.error_bias
+
+        self.pivot_x = np.full(count, WIDTH/2)
+        self.pivot_y = HEIGHT/2
+        self.pivot_velocity_x = np.zeros(count)
+
+        self.bob_position = np.empty((count, 2))
+        self.bob_position[:, 0] = self.pivot_x
+        self.bob_position[:, 1] = self.pivot_y + 100
+        self.bob_velocity = np.zeros((count, 2))
+
+        self.pendulum_length = 100.0
+
+    def move_pivots(self, move_speed):
+        """Vectorized version of the pivot update done for each `Pendulum` in the control loops."""
+        self.pivot_velocity_x = np.asarray(move_speed, dtype=float)
+        self.pivot_x = np.clip(self.pivot_x + move_speed, WIDTH/6, WIDTH - WIDTH/6)
+
+    def step(self, dt):
+        # Integrate positions with the velocities from the previous step.
+        # Like pymunk, the kinematic pivots are only moved by `move_pivots`, their velocity only feeds the joint.
+        self.bob_position += self.bob_velocity * dt
+
+        # Direction of the pin joint, from the bob to the pivot
+        dx = self.pivot_x - self.bob_position[:, 0]
+        dy = self.pivot_y - self.bob_position[:, 1]
+        dist = np.sqrt(dx**2 + dy**2)
+        inverse_dist = np.divide(1.0, dist, out=np.zeros_like(dist), where=dist != 0)
+        nx = dx * inverse_dist
+        ny = dy * inverse_dist
+
+        # Velocity the joint needs along its direction to correct the length error
+        bias = -(1 - pow(self.error_bias, dt)) * (dist - self.pendulum_length) / dt
+
+        # Gravity, then the impulse that makes the relative normal velocity match the bias
+        self.bob_velocity[:, 1] += self.gravity * dt
+        normal_velocity = (self.pivot_velocity_x - self.bob_velocity[:, 0]) * nx - self.bob_velocity[:, 1] * ny
+        correction = bias - normal_velocity
+        self.bob_velocity[:, 0] -= nx * correction
+        self.bob_velocity[:, 1] -= ny * correction
+
+    def get_angular_velocity(self):
+        dx = self.bob_position[:, 0] - self.pivot_x
+        dy = self.bob_position[:, 1] - self.pivot_y
+        pendulum_length = np.sqrt(dx**2 + dy**2)
+
+        rel_velocity_x = self.bob_velocity[:, 0] - self.pivot_velocity_x
+        rel_velocity_y = self.bob_velocity[:, 1]
+
+        # Tangential speed divided by the radius, 0 where the arm has no length
+        tangential_speed = (rel_velocity_y * dx - rel_velocity_x * dy) / np.where(pendulum_length == 0, 1, pendulum_length)
+        return np.divide(tangential_speed, pendulum_length, out=np.zeros_like(pendulum_length), where=pendulum_length != 0)
+
+    def get_sensory_data(self):
+        """Returns a (count, 3) array whose rows match `Pendulum.get_sensory_data`."""
+        dx = self.bob_position[:, 0] - self.pivot_x
+        dy = self.bob_position[:, 1] - self.pivot_y
+
+        sensory_data = np.empty((self.count, 3))
+        sensory_data[:, 0] = (self.pivot_x - WIDTH/6) / (WIDTH - WIDTH/3) * 2 - 1
+        sensory_data[:, 1] = np.arctan2(dy, dx) / math.pi
+        sensory_data[:, 2] = self.get_angular_velocity() / math.pi
+        return sensory_data
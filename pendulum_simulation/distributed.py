@@ -0,0 +1,310 @@
+"""
+Evaluation of genomes on other machines, over TCP.
+
+The trainer (`train.py --listen HOST:PORT`) runs a `RemoteEvaluator`, and any number of workers connect to it:
+
+    python pendulum_simulation/distributed.py --connect HOST:PORT
+
+A worker loads its own `neat_config.txt`, which must be identical to the trainer's, receives the simulation
+settings when it connects, then evaluates the batches of genomes it is sent with `train.simulate`, one at a time.
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import neat
+
+PROTOCOL_VERSION = 1
+
+# Every message is a frame: payload length (uint32) and message type (uint8), then the payload
+FRAME = struct.Struct("<IB")
+HELLO, SETTINGS, TASK, RESULT, STOP, ERROR = range(1, 7)  # HELLO, SETTINGS and ERROR carry JSON
+
+# Genomes travel as a header and fixed size records, activation and aggregation functions as indices into the
+# option lists of the (identical) configurations
+GENOME = struct.Struct("<qHH")  # key, node count, connection count
+NODE = struct.Struct("<iddBB")  # key, bias, response, activation, aggregation
+CONNECTION = struct.Struct("<iidB")  # input key, output key, weight, enabled
+BATCH = struct.Struct("<QH")  # batch id, genome count (a RESULT is followed by one float64 fitness per genome)
+
+def config_digest(config_path):
+    """Digest of a NEAT configuration file that ignores line endings, so checkouts on any system agree."""
+    with open(config_path) as config_file:
+        return hashlib.sha256("\n".join(config_file.read().splitlines()).encode()).hexdigest()
+
+def send(connection, kind, payload=b""):
+    connection.sendall(FRAME.pack(len(payload), kind) + payload)
+
+def _receive_exactly(connection, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+def receive(connection):
+    """The type and payload of the next message on `connection`."""
+    length, kind = FRAME.unpack(_receive_exactly(connection, FRAME.size))
+    return kind, _receive_exactly(connection, length)
+
+def encode_genomes(batch_id, genomes, genome_config):
+    activations = {name: i for i, name in enumerate(genome_config.activation_options)}
+    aggregations = {name: i for i, name in enumerate(genome_config.aggregation_options)}
+    parts = [BATCH.pack(batch_id, len(genomes))]
+    for genome in genomes:
+        parts.append(GENOME.pack(genome.key, len(genome.nodes), len(genome.connections)))
+        for key, node in genome.nodes.items():
+            parts.append(NODE.pack(key, node.bias, node.response, activations[node.activation], aggregations[node.aggregation]))
+        for (input_key, output_key), connection in genome.connections.items():
+            parts.append(CONNECTION.pack(input_key, output_key, connection.weight, connection.enabled))
+    return b"".join(parts)
+
+def decode_genomes(payload, config):
+    """The batch id and the genomes of a TASK payload, rebuilt as `config.genome_type` instances."""
+    genome_config = config.genome_config
+    batch_id, genome_count = BATCH.unpack_from(payload)
+    offset = BATCH.size
+    genomes = []
+    for _ in range(genome_count):
+        key, node_count, connection_count = GENOME.unpack_from(payload, offset)
+        offset += GENOME.size
+        genome = config.genome_type(key)
+        for _ in range(node_count):
+            node_key, bias, response, activation, aggregation = NODE.unpack_from(payload, offset)
+            offset += NODE.size
+            node = genome_config.node_gene_type(node_key)
+            node.bias = bias
+            node.response = response
+            node.activation = genome_config.activation_options[activation]
+            node.aggregation = genome_config.aggregation_options[aggregation]
+            genome.nodes[node_key] = node
+        for _ in range(connection_count):
+            input_key, output_key, weight, enabled = CONNECTION.unpack_from(payload, offset)
+            offset += CONNECTION.size
+            connection = genome_config.connection_gene_type((input_key, output_key))
+            connection.weight = weight
+            connection.enabled = bool(enabled)
+            genome.connections[(input_key, output_key)] = connection
+        genomes.append(genome)
+    return batch_id, genomes
+
+def encode_result(batch_id, fitnesses):
+    return BATCH.pack(batch_id, len(fitnesses)) + struct.pack(f"<{len(fitnesses)}d", *fitnesses)
+
+def decode_result(payload):
+    batch_id, count = BATCH.unpack_from(payload)
+    return batch_id, list(struct.unpack_from(f"<{count}d", payload, BATCH.size))
+
+class RemoteEvaluator:
+    """
+    Trainer side of distributed evaluation: a TCP server that hands out the genomes of each generation in batches
+    of `batch_size` to the connected workers.
+
+    Workers pull a new batch whenever they finish one, so faster workers simply evaluate more of them. Once no batch
+    is left waiting, an idle worker steals a copy of the batch that has been running the longest, and whichever copy
+    finishes first counts: a slow worker cannot hold up the end of a generation. A worker that disconnects, or takes
+    longer than `task_timeout` seconds to answer, is dropped and its batches go back to the queue, so the generation
+    still completes as long as one worker is left (the others can reconnect at any time).
+    """
+    def __init__(self, address, config, config_digest, settings, batch_size=10, task_timeout=120):
+        self.config = config
+        self.config_digest = config_digest
+        self.settings = settings
+        self.batch_size = batch_size
+        self.task_timeout = task_timeout
+
+        self.lock = threading.Condition()
+        self.next_batch_id = 0
+        self.waiting = collections.deque()  # Ids of the batches no worker is evaluating
+        self.payloads = {}  # Encoded TASK payload of every unfinished batch of the current generation
+        self.running = {}  # Batch id -> (start time, workers evaluating it)
+        self.results = {}
+        self.workers = set()
+        self.stopped = False
+
+        self.server = socketserver.ThreadingTCPServer(address, _WorkerHandler, bind_and_activate=False)
+        self.server.allow_reuse_address = True
+        self.server.daemon_threads = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.server.evaluator = self
+        self.address = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"Waiting for evaluation workers on {self.address[0]}:{self.address[1]}")
+
+    def evaluate(self, genomes):
+        """Evaluates `genomes` on the workers and returns their fitness values in order. Blocks until all are known."""
+        batch_ids = []
+        with self.lock:
+            for start in range(0, len(genomes), self.batch_size):
+                batch_id = self.next_batch_id
+                self.next_batch_id += 1
+                self.payloads[batch_id] = encode_genomes(batch_id, genomes[start:start + self.batch_size], self.config.genome_config)
+                self.waiting.append(batch_id)
+                batch_ids.append(batch_id)
+            self.lock.notify_all()
+            if not self.workers:
+                print("No evaluation worker connected, waiting for one")
+            while any(batch_id not in self.results for batch_id in batch_ids):
+                self.lock.wait()
+            fitnesses = []
+            for batch_id in batch_ids:
+                fitnesses.extend(self.results.pop(batch_id))
+        return fitnesses
+
+    def next_task(self, worker):
+        """The id and payload of the next batch for `worker`, waiting for one if needed, or None once closed."""
+        with self.lock:
+            while not self.stopped:
+                if self.waiting:
+                    batch_id = self.waiting.popleft()
+                    self.running[batch_id] = (time.monotonic(), {worker})
+                    return batch_id, self.payloads[batch_id]
+                # Steal the longest running batch this worker is not already on
+                candidates = [(start, batch_id) for batch_id, (start, workers) in self.running.items() if worker not in workers]
+                if candidates:
+                    start, batch_id = min(candidates)
+                    self.running[batch_id][1].add(worker)
+                    return batch_id, self.payloads[batch_id]
+                self.lock.wait()
+            return None
+
+    def complete(self, worker, batch_id, fitnesses):
+        with self.lock:
+            if batch_id in self.payloads:  # Otherwise another copy already finished
+                del self.payloads[batch_id]
+                self.running.pop(batch_id, None)
+                self.results[batch_id] = fitnesses
+                self.lock.notify_all()
+
+    def worker_joined(self, worker):
+        with self.lock:
+            self.workers.add(worker)
+            self.lock.notify_all()
+        print(f"Evaluation worker {worker.name} connected ({len(self.workers)} in total)")
+
+    def worker_lost(self, worker):
+        """Puts the batches only `worker` was evaluating back at the front of the queue."""
+        with self.lock:
+            self.workers.discard(worker)
+            for batch_id, (start, workers) in list(self.running.items()):
+                workers.discard(worker)
+                if not workers:
+                    del self.running[batch_id]
+                    self.waiting.appendleft(batch_id)
+            self.lock.notify_all()
+        if not self.stopped:
+            print(f"Evaluation worker {worker.name} disconnected ({len(self.workers)} left)")
+
+    def close(self):
+        """Sends STOP to the workers and shuts the server down."""
+        with self.lock:
+            self.stopped = True
+            self.lock.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    """One connected worker: checks its configuration, then sends it batches and collects their results."""
+    def handle(self):
+        evaluator = self.server.evaluator
+        connection = self.request
+        connection.settimeout(evaluator.task_timeout)
+        self.name = f"{self.client_address[0]}:{self.client_address[1]}"
+        try:
+            kind, payload = receive(connection)
+            hello = json.loads(payload) if kind == HELLO else {}
+            if hello.get("protocol") != PROTOCOL_VERSION or hello.get("config") != evaluator.config_digest:
+                send(connection, ERROR, json.dumps({"error": "protocol version or neat_config.txt differs from the trainer's"}).encode())
+                return
+            self.name = hello.get("name", self.name)
+            send(connection, SETTINGS, json.dumps(evaluator.settings).encode())
+        except (OSError, ValueError):
+            return
+
+        evaluator.worker_joined(self)
+        try:
+            while True:
+                task = evaluator.next_task(self)
+                if task is None:
+                    send(connection, STOP)
+                    return
+                batch_id, payload = task
+                send(connection, TASK, payload)
+                kind, payload = receive(connection)
+                if kind != RESULT:
+                    return
+                evaluator.complete(self, *decode_result(payload))
+        except OSError:  # Disconnected or timed out, socket.timeout and ConnectionError are both OSErrors
+            pass
+        finally:
+            evaluator.worker_lost(self)
+
+def run_worker(host, port, config_path, give_up_after=30):
+    """
+    Connects to the trainer at `host:port` and evaluates the batches it sends until told to stop. A lost connection
+    is retried, and the worker gives up once it could not reconnect for `give_up_after` seconds.
+    """
+    import train
+
+    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+    hello = json.dumps({"protocol": PROTOCOL_VERSION, "config": config_digest(config_path),
+                        "name": f"{socket.gethostname()}/{os.getpid()}"}).encode()
+    last_connected = time.monotonic()
+    while time.monotonic() - last_connected < give_up_after:
+        try:
+            connection = socket.create_connection((host, port), timeout=5)
+        except OSError:
+            time.sleep(1)
+            continue
+        try:
+            connection.settimeout(None)  # Waiting for the next generation can take any time
+            send(connection, HELLO, hello)
+            kind, payload = receive(connection)
+            if kind == ERROR:
+                print(f"Rejected by the trainer: {json.loads(payload)['error']}")
+                return
+            train._init_worker(config, json.loads(payload))
+            print(f"Connected to {host}:{port}")
+            while True:
+                kind, payload = receive(connection)
+                if kind == STOP:
+                    print("Training finished")
+                    return
+                batch_id, genomes = decode_genomes(payload, config)
+                send(connection, RESULT, encode_result(batch_id, train.simulate(genomes, config, train.space)))
+                last_connected = time.monotonic()
+        except OSError:
+            print(f"Lost the connection to {host}:{port}, reconnecting")
+            last_connected = time.monotonic()
+        finally:
+            connection.close()
+    print(f"Could not reach {host}:{port} for {give_up_after} s, giving up")
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def main():
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Evaluate genomes for a trainer started with 'train.py --listen'")
+    parser.add_argument("--connect", required=True, metavar="HOST:PORT", help="address the trainer listens on")
+    parser.add_argument("--config", default=os.path.join(local_dir, "neat_config.txt"),
+                        help="NEAT configuration, identical to the trainer's (default: %(default)s)")
+    parser.add_argument("--give-up-after", type=float, default=30,
+                        help="seconds without reaching the trainer before exiting (default: %(default)s)")
+    args = parser.parse_args()
+    run_worker(*parse_address(args.connect), args.config, args.give_up_after)
+
+if __name__ == "__main__":
+    main()
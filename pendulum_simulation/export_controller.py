@@ -0,0 +1,118 @@
+"""
+Compiles a trained genome into a standalone controller: a generated Python module whose `activate` function
+evaluates the network as straight-line code, with the weights as constants. It needs neither neat nor the
+configuration to load, and returns exactly what `neat.nn.FeedForwardNetwork.activate` returns.
+
+    python export_controller.py   # best_network.pkl -> best_controller.py
+
+`AI_control.py` uses the exported controller when it was exported from the current `best_network.pkl`.
+"""
+import argparse
+import hashlib
+import importlib.util
+import os
+import pickle
+
+# neat.activations as Python expressions of `{z}`, with the same scaling and clamping
+ACTIVATION_EXPRESSIONS = {
+    "sigmoid": "1.0 / (1.0 + math.exp(-max(-60.0, min(60.0, 5.0 * {z}))))",
+    "tanh": "math.tanh(max(-60.0, min(60.0, 2.5 * {z})))",
+    "sin": "math.sin(max(-60.0, min(60.0, 5.0 * {z})))",
+    "relu": "({z} if {z} > 0.0 else 0.0)",
+    "identity": "{z}",
+    "clamped": "max(-1.0, min(1.0, {z}))",
+    "abs": "abs({z})",
+    "square": "{z} ** 2",
+    "cube": "{z} ** 3",
+}
+
+# neat.aggregations as Python expressions of the list of weighted inputs, in the order neat sums them
+AGGREGATION_EXPRESSIONS = {
+    "sum": lambda terms: " + ".join(["0.0"] + terms),
+    "product": lambda terms: " * ".join(["1.0"] + [f"({term})" for term in terms]),
+    "max": lambda terms: f"max([{', '.join(terms)}])",
+    "min": lambda terms: f"min([{', '.join(terms)}])",
+}
+
+def network_digest(network_path):
+    """Digest of a pickled genome, stored in the controllers exported from it."""
+    with open(network_path, 'rb') as input_file:
+        return hashlib.blake2b(input_file.read(), digest_size=16).hexdigest()
+
+def _variable(key):
+    return f"input{-key}" if key < 0 else f"node{key}"
+
+def generate_source(genome, config, source_digest=""):
+    """Source code of the controller module for `genome`."""
+    import neat
+
+    network = neat.nn.FeedForwardNetwork.create(genome, config)
+    lines = [
+        '"""Pendulum controller exported by export_controller.py, do not edit."""',
+        "import math",
+        "",
+        f"SOURCE_DIGEST = {source_digest!r}",
+        f"FITNESS = {genome.fitness!r}",
+        "",
+        "def activate(inputs):",
+        f"    {', '.join(_variable(key) for key in network.input_nodes)}, = inputs",
+    ]
+    for node, act_func, agg_func, bias, response, links in network.node_evals:
+        gene = genome.nodes[node]
+        if gene.activation not in ACTIVATION_EXPRESSIONS:
+            raise ValueError(f"Activation function '{gene.activation}' can not be exported")
+        if gene.aggregation not in AGGREGATION_EXPRESSIONS:
+            raise ValueError(f"Aggregation function '{gene.aggregation}' can not be exported")
+        terms = [f"{_variable(i)} * {w!r}" for i, w in links]
+        aggregated = AGGREGATION_EXPRESSIONS[gene.aggregation](terms)
+        z = f"({bias!r} + {response!r} * ({aggregated}))"
+        lines.append(f"    {_variable(node)} = {ACTIVATION_EXPRESSIONS[gene.activation].format(z=z)}")
+    # Outputs neat leaves out of the phenotype stay at 0.0
+    evaluated = {node for node, *_ in network.node_evals}
+    outputs = [_variable(key) if key in evaluated else "0.0" for key in network.output_nodes]
+    lines.append(f"    return [{', '.join(outputs)}]")
+    return "\n".join(lines) + "\n"
+
+def export(network_path, config_path, output_path):
+    """Compiles the genome pickled at `network_path` into the controller module `output_path`."""
+    import neat
+
+    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+    with open(network_path, 'rb') as input_file:
+        genome = pickle.load(input_file)
+    source = generate_source(genome, config, network_digest(network_path))
+    temporary_path = output_path + ".tmp"
+    with open(temporary_path, "w") as output:
+        output.write(source)
+    os.replace(temporary_path, output_path)
+
+def load_controller(controller_path, network_path=None):
+    """
+    Imports an exported controller module. With `network_path`, returns None unless the controller was exported
+    from that exact genome, so a controller left over from an earlier training is never used by mistake.
+    """
+    if not os.path.exists(controller_path):
+        return None
+    spec = importlib.util.spec_from_file_location("exported_controller", controller_path)
+    controller = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(controller)
+    if network_path is not None and (not os.path.exists(network_path) or controller.SOURCE_DIGEST != network_digest(network_path)):
+        return None
+    return controller
+
+def main():
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Compile a trained genome into a standalone controller module")
+    parser.add_argument("--network", default=os.path.join(local_dir, "best_network.pkl"),
+                        help="pickled genome (default: %(default)s)")
+    parser.add_argument("--config", default=os.path.join(local_dir, "neat_config.txt"),
+                        help="NEAT configuration of the genome (default: %(default)s)")
+    parser.add_argument("--output", default=os.path.join(local_dir, "best_controller.py"),
+                        help="controller module to write (default: %(default)s)")
+    args = parser.parse_args()
+    export(args.network, args.config, args.output)
+    print(f"Controller exported to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
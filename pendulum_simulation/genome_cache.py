@@ -0,0 +1,74 @@
+import hashlib
+from collections import OrderedDict
+import neat
+
+class GenomeCache(neat.reporting.BaseReporter):
+    """
+    Fitness values and phenotypes of already evaluated genomes, keyed by genome content.
+
+    Every pendulum starts from the same state, so an episode only depends on the genome and on the simulation
+    settings. The key hashes exactly that: the node genes, the enabled connections with their weights, and the
+    settings. Elites carried over unchanged and offspring that reproduction left unmutated get the same key as
+    before and are never simulated twice. The least recently used entries are evicted beyond `max_size`.
+    """
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> [fitness, network], either may be None
+        self.hits = 0
+        self.misses = 0
+        self.generation_hits = 0
+        self.generation_misses = 0
+
+    @staticmethod
+    def genome_key(genome, settings):
+        """Hash of everything an episode of `genome` depends on. `settings` is a dict of simulation parameters."""
+        h = hashlib.blake2b(digest_size=16)
+        for key in sorted(genome.nodes):
+            node = genome.nodes[key]
+            h.update(repr(("node", key, node.bias, node.response, node.activation, node.aggregation)).encode())
+        for key in sorted(genome.connections):
+            connection = genome.connections[key]
+            if connection.enabled:
+                h.update(repr(("connection", key, connection.weight)).encode())
+        h.update(repr(sorted(settings.items())).encode())
+        return h.digest()
+
+    def _entry(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def fitness(self, key):
+        """Returns the cached fitness for `key`, or None, and counts the hit or miss."""
+        entry = self._entry(key)
+        if entry is not None and entry[0] is not None:
+            self.generation_hits += 1
+            return entry[0]
+        self.generation_misses += 1
+        return None
+
+    def network(self, key):
+        entry = self._entry(key)
+        return None if entry is None else entry[1]
+
+    def store(self, key, fitness=None, network=None):
+        """Adds or completes the entry for `key`. None leaves a value that is already cached as it is."""
+        entry = self.entries.setdefault(key, [None, None])
+        self.entries.move_to_end(key)
+        if fitness is not None:
+            entry[0] = fitness
+        if network is not None:
+            entry[1] = network
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def start_generation(self, generation):
+        self.generation_hits = 0
+        self.generation_misses = 0
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.hits += self.generation_hits
+        self.misses += self.generation_misses
+        print(f"Genome cache: {self.generation_hits} hits, {self.generation_misses} misses "
+              f"({self.hits} hits, {self.misses} misses overall, {len(self.entries)} entries)")
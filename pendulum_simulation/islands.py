@@ -0,0 +1,228 @@
+"""
+Island model: several NEAT populations evolving side by side, each in a process of its own, that exchange their
+best genomes every few generations.
+
+    python islands.py --compare 1 2 4 --threshold 10   # wall-clock time to the fitness threshold per island count
+
+`train.py --islands K` trains this way and saves the best genome of all islands whenever it improves.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from itertools import count
+import neat
+from checkpoint import BestGenomeExporter
+
+TOPOLOGIES = ("ring", "full")
+
+class IslandReporter(neat.reporting.BaseReporter):
+    """Keeps the `migrant_count` fittest genomes of the last evaluated generation and when the threshold was reached."""
+    def __init__(self, migrant_count):
+        self.migrant_count = migrant_count
+        self.migrants = []
+        self.solved_at = None
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.migrants = sorted(population.values(), key=lambda genome: genome.fitness, reverse=True)[:self.migrant_count]
+
+    def found_solution(self, config, generation, best):
+        self.solved_at = time.perf_counter()
+
+def adopt(population, migrants, node_keys):
+    """
+    Puts `migrants`, (source island, genome) pairs, into the unevaluated next generation of `population` in place of
+    its newest offspring, so its elites survive.
+
+    Hidden node keys are only unique within one island, and since connection genes are keyed by the nodes they join,
+    they are the innovation numbers of neat-python: every hidden node of a migrant is given a key of this island,
+    the same one each time that node of that island arrives (`node_keys` remembers them), so migrants stay valid and
+    genes that share an origin still line up in crossover. Input and output keys are the same everywhere.
+    """
+    if not migrants:
+        return
+    config = population.config
+    genome_config = config.genome_config
+    if genome_config.node_indexer is None:
+        genome_config.node_indexer = count(max(key for genome in population.population.values() for key in genome.nodes) + 1)
+    fixed_keys = set(genome_config.input_keys) | set(genome_config.output_keys)
+
+    # Offspring keys are handed out after all the keys of the previous generation, elites keep theirs
+    for key in sorted(population.population)[-len(migrants):]:
+        del population.population[key]
+    for source, genome in migrants:
+        migrant = config.genome_type(next(population.reproduction.genome_indexer))
+        local_keys = {}
+        for key, node in genome.nodes.items():
+            if key not in fixed_keys:
+                if (source, key) not in node_keys:
+                    node_keys[(source, key)] = next(genome_config.node_indexer)
+                local_keys[key] = node_keys[(source, key)]
+            local_node = node.copy()
+            local_node.key = local_keys.get(key, key)
+            migrant.nodes[local_node.key] = local_node
+        for (input_key, output_key), connection in genome.connections.items():
+            local_connection = connection.copy()
+            local_connection.key = (local_keys.get(input_key, input_key), local_keys.get(output_key, output_key))
+            migrant.connections[local_connection.key] = local_connection
+        population.population[migrant.key] = migrant
+        population.reproduction.ancestors[migrant.key] = tuple()
+    population.species.speciate(config, population.population, population.generation)
+
+def _island_process(index, config_path, settings, cache_size, seed, migrant_count, fitness_threshold, connection):
+    """
+    One island: its own population, random state and physics space. Receives ("evolve", generations, migrants)
+    and answers with a report after that many generations, until it receives ("stop",).
+    """
+    import train
+    from genome_cache import GenomeCache
+
+    random.seed(seed)
+    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+    if fitness_threshold is not None:
+        config.fitness_threshold = fitness_threshold
+    train._init_worker(config, settings)
+    population = neat.Population(config)
+    reporter = IslandReporter(migrant_count)
+    population.add_reporter(reporter)
+    if cache_size > 0:
+        train.genome_cache = GenomeCache(cache_size)  # Not added as a reporter, so the islands don't all print its statistics
+    node_keys = {}
+
+    while True:
+        message = connection.recv()
+        if message[0] == "stop":
+            break
+        command, generations, migrants = message
+        adopt(population, migrants, node_keys)
+        start = time.perf_counter()
+        population.run(train.fitness_function, generations)
+        solved = reporter.solved_at is not None
+        connection.send({
+            "island": index,
+            "generation": population.generation,
+            "best_genome": population.best_genome,
+            "migrants": reporter.migrants,
+            "solved_after": reporter.solved_at - start if solved else None,
+        })
+        if solved:
+            break
+    connection.close()
+
+def route(reports, topology):
+    """The migrants every island receives: from the previous island on a ring, or from all the others."""
+    incoming = [[] for _ in reports]
+    for report in reports:
+        source = report["island"]
+        if topology == "ring":
+            targets = [(source + 1) % len(reports)] if len(reports) > 1 else []
+        else:
+            targets = [target for target in range(len(reports)) if target != source]
+        for target in targets:
+            incoming[target].extend((source, genome) for genome in report["migrants"])
+    return incoming
+
+def run_islands(config_path, settings, island_count, max_generations, migration_interval=5, migrant_count=2,
+                topology="ring", cache_size=1000, seed=0, fitness_threshold=None, save_path=None, export=None,
+                budget=None):
+    """
+    Evolves `island_count` populations in parallel for at most `max_generations`, with a migration every
+    `migration_interval` generations, and stops once any island reaches the fitness threshold. The best genome
+    of all islands is returned with the wall-clock seconds it took to reach the threshold, None if it was not reached.
+    With a `save_path`, the best genome is saved there atomically whenever it improves, and `export` called with the
+    path, as `checkpoint.BestGenomeExporter` does for a single population.
+    With a `budget.TimeBudget`, islands evolve until the next generation is not expected to fit in it instead of for
+    `max_generations`, and the last exchange interval is shortened to the generations that still fit.
+    """
+    exporter = BestGenomeExporter(save_path, export) if save_path is not None else None
+    connections = []
+    processes = []
+    for index in range(island_count):
+        parent_connection, child_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_island_process, daemon=True,
+                                          args=(index, config_path, settings, cache_size, seed + index, migrant_count,
+                                                fitness_threshold, child_connection))
+        process.start()
+        connections.append(parent_connection)
+        processes.append(process)
+
+    start = time.perf_counter()
+    best_genome = None
+    time_to_threshold = None
+    migrants = [[] for _ in range(island_count)]
+    generation = 0
+    try:
+        while time_to_threshold is None:
+            if budget is not None:
+                generations = budget.generations_that_fit(migration_interval)
+                if generations == 0:
+                    print(budget.stop_message(generation - 1))
+                    break
+            elif generation < max_generations:
+                generations = min(migration_interval, max_generations - generation)
+            else:
+                break
+            epoch_start = time.perf_counter()
+            for connection, incoming in zip(connections, migrants):
+                connection.send(("evolve", generations, incoming))
+            reports = [connection.recv() for connection in connections]
+            generation += generations
+            if budget is not None:
+                budget.record(time.perf_counter() - epoch_start, generations)
+
+            for report in reports:
+                if best_genome is None or report["best_genome"].fitness > best_genome.fitness:
+                    best_genome = report["best_genome"]
+            if exporter is not None:
+                exporter.offer(best_genome)
+            solve_times = [report["solved_after"] for report in reports if report["solved_after"] is not None]
+            if solve_times:
+                time_to_threshold = epoch_start - start + min(solve_times)
+            island_bests = "  ".join(f"{report['best_genome'].fitness:6.2f}" for report in reports)
+            print(f"Generation {generation:4d}  {time.perf_counter() - start:7.1f} s  island bests: {island_bests}"
+                  f"  global best: {best_genome.fitness:.2f}")
+            migrants = route(reports, topology)
+    finally:
+        for connection, process in zip(connections, processes):
+            if process.is_alive():
+                try:
+                    connection.send(("stop",))
+                except (BrokenPipeError, OSError):
+                    pass
+            process.join(timeout=5)
+
+    return best_genome, time_to_threshold
+
+def main():
+    import train
+
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Compare the wall-clock time to the fitness threshold per island count")
+    parser.add_argument("--compare", type=int, nargs="+", default=[1, 2, 4], metavar="K", help="island counts to run")
+    parser.add_argument("--threshold", type=float, help="fitness threshold (default: the one of neat_config.txt)")
+    parser.add_argument("--generations", type=int, default=train.max_generations,
+                        help="generations at most per run (default: %(default)s)")
+    parser.add_argument("--migration-interval", type=int, default=train.migration_interval)
+    parser.add_argument("--migrants", type=int, default=train.migrant_count)
+    parser.add_argument("--topology", choices=TOPOLOGIES, default=train.migration_topology)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config_path = os.path.join(local_dir, 'neat_config.txt')
+    results = []
+    for island_count in args.compare:
+        print(f"--- {island_count} island(s) ---")
+        best_genome, time_to_threshold = run_islands(config_path, train._sim_settings(), island_count, args.generations,
+                                                     args.migration_interval, args.migrants, args.topology,
+                                                     train.cache_size, args.seed, args.threshold)
+        results.append((island_count, time_to_threshold, best_genome.fitness))
+
+    print(f"\n{'islands':>7}  {'time to threshold':>17}  {'best fitness':>12}")
+    for island_count, time_to_threshold, best_fitness in results:
+        reached = "not reached" if time_to_threshold is None else f"{time_to_threshold:.1f} s"
+        print(f"{island_count:>7}  {reached:>17}  {best_fitness:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,29 @@
 import pygame
 import pymunk
-import pymunk.pygame_util
-from commons import Pendulum, WIDTH, HEIGHT
+import argparse
+from commons import PHYSICS_SUBSTEPS, FixedStepLoop, Pendulum, WIDTH, HEIGHT, draw_pendulum, step_physics
 
 # Configuration
-FPS = 60
+FPS = 60  # Frames drawn per second at most, the pivot is moved at commons.CONTROL_RATE whatever this is
 
-def main():
+def main(window=None, max_frames=None, fps=FPS, substeps=PHYSICS_SUBSTEPS):
+    """
+    With a `window`, the simulation draws on that display surface and leaves pygame initialised when it returns,
+    otherwise it opens its own window. `max_frames` ends it after that many frames.
+    The pendulum is stepped like in training, `substeps` physics steps per control tick, and drawn at `fps` frames
+    per second at most.
+    """
     # Initialize Pygame
-    pygame.init()
-    window = pygame.display.set_mode((WIDTH, HEIGHT))
+    own_window = window is None
+    if own_window:
+        pygame.init()
+        window = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Pendulum Simulation - Manual Control")
     clock = pygame.time.Clock()
     
     # Set up physics space
     space = pymunk.Space()
     space.gravity = (0, 981)
-    draw_options = pymunk.pygame_util.DrawOptions(window)
     
     # Create the pendulum
     pendulum = Pendulum(space)
@@ -26,6 +33,10 @@ def main():
     
     print("Simulation running... Press ESC or close window to exit.")
     
+    loop = FixedStepLoop()
+    previous_positions = pendulum.positions()
+    sensory_data = pendulum.get_sensory_data()
+    frames = 0
     running = True
     while running:
         # Handle events
@@ -36,9 +47,6 @@ def main():
                 if event.key == pygame.K_ESCAPE:
                     running = False
         
-        # Get sensory data from pendulum
-        sensory_data = pendulum.get_sensory_data()
-        
         # Use the keyboard to control the pendulum
         keys = pygame.key.get_pressed()
         if keys[pygame.K_LEFT]:
@@ -48,20 +56,27 @@ def main():
         else:
             move_speed = 0
         
-        # Apply the movement to the pendulum pivot
-        pendulum.pivot_body.velocity = (move_speed, 0)
-        pendulum.pivot_body.position = (
-            max(WIDTH/6, min(WIDTH - WIDTH/6, pendulum.pivot_body.position.x + move_speed)),
-            pendulum.pivot_body.position.y
-        )
-        
-        # Step the physics simulation
-        dt = 1.0 / FPS
-        space.step(dt)
+        # Run the control ticks due since the last frame
+        for _ in range(loop.ticks()):
+            previous_positions = pendulum.positions()
+
+            # Get sensory data from pendulum
+            sensory_data = pendulum.get_sensory_data()
+
+            # Apply the movement to the pendulum pivot
+            pendulum.pivot_body.velocity = (move_speed, 0)
+            pendulum.pivot_body.position = (
+                max(WIDTH/6, min(WIDTH - WIDTH/6, pendulum.pivot_body.position.x + move_speed)),
+                pendulum.pivot_body.position.y
+            )
+
+            # Step the physics simulation
+            step_physics(space, loop.dt, substeps)
         
-        # Draw everything
+        # Draw everything, between the last two ticks
         window.fill((240, 240, 240))  # Light gray background
-        space.debug_draw(draw_options)
+        pivot, bob = loop.interpolate(previous_positions, pendulum.positions())
+        draw_pendulum(window, pivot, bob)
         
         # Display information
         pivot_x, angle, angular_vel = sensory_data
@@ -84,10 +99,19 @@ def main():
         window.blit(keys_text, (20, HEIGHT - 30))
         
         pygame.display.update()
-        clock.tick(FPS)
+        clock.tick(fps)
+        frames += 1
+        if max_frames is not None and frames >= max_frames:
+            running = False
     
-    pygame.quit()
+    if own_window:
+        pygame.quit()
     print("Simulation ended.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Balance the pendulum with the arrow keys")
+    parser.add_argument("--fps", type=int, default=FPS, help="frames drawn per second at most (default: %(default)s)")
+    parser.add_argument("--substeps", type=int, default=PHYSICS_SUBSTEPS,
+                        help="physics steps per control tick (default: %(default)s)")
+    args = parser.parse_args()
+    main(fps=args.fps, substeps=args.substeps)
\ No newline at end of file
@@ -0,0 +1,54 @@
+import cProfile
+import io
+import pstats
+import time
+import neat
+
+PHASES = ("network creation", "setup", "sensors", "activation", "pivot update", "fitness", "space.step", "rendering", "teardown")
+
+class PhaseProfiler(neat.reporting.BaseReporter):
+    """
+    Splits the wall time of every generation's evaluation into the phases of `train.simulate` and prints the breakdown.
+
+    The simulation only reads the clock when a profiler is installed (`train.phase_profiler`), so leaving it out
+    costs one boolean test per timed section. The genome cache lookups count as "network creation", time spent
+    outside the timed sections (the worker pool, racing) shows up as "other". With `profile_generation`, that
+    generation is also run under cProfile: the statistics are saved to `profile_path` and the `top` most expensive
+    functions printed.
+    """
+    def __init__(self, profile_generation=None, profile_path="training.pstats", top=20):
+        self.profile_generation = profile_generation
+        self.profile_path = profile_path
+        self.top = top
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.generation = None
+        self.start_time = None
+        self.profile = None
+
+    def add(self, phase, seconds):
+        self.phase_times[phase] += seconds
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        if generation == self.profile_generation:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start_time = time.perf_counter()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        total = time.perf_counter() - self.start_time
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.profile_path)
+            stream = io.StringIO()
+            pstats.Stats(self.profile, stream=stream).sort_stats("cumulative").print_stats(self.top)
+            print(stream.getvalue())
+            print(f"Profile of generation {self.generation} saved to '{self.profile_path}'")
+            self.profile = None
+
+        other = max(0.0, total - sum(self.phase_times.values()))
+        print(f"Evaluation time: {total:.3f} sec")
+        for phase, seconds in list(self.phase_times.items()) + [("other", other)]:
+            if seconds > 0:
+                print(f"    {phase:<17} {seconds:8.3f} sec  {100 * seconds / total:5.1f}%")
@@ -0,0 +1,109 @@
+import math
+import neat
+
+class Race:
+    """
+    Early termination for one episode.
+
+    A genome earns at most `dt` fitness per step (the center coefficient never exceeds 1), so after any step its
+    final fitness lies between its current fitness and its current fitness plus `dt` per remaining step.
+    A genome is dropped once its upper bound is below `fitness_threshold` and enough members of its species are
+    already certain to finish above it to fill every place that species keeps through elitism and the survival
+    threshold. Such a genome can neither be an elite, be a parent nor end the run, and its species' best fitness,
+    which stagnation tracks, is unchanged. Its own fitness is left at the lower bound it reached when it was dropped.
+
+    That lower bound is not neutral: `DefaultReproduction` spawns offspring by adjusted fitness, which uses the mean
+    fitness of every species and the minimum fitness of the whole population, so a dropped genome lowers its
+    species' mean and can lower the population minimum, and racing shifts how many offspring every species gets.
+    The mean and spread of the population's fitness reported by neat and the telemetry are lowered the same way.
+    No value avoids this, the final fitness is only known to lie between the two bounds. Genomes are only dropped
+    once they provably lose, late in the episode, so the steps saved are usually a few percent.
+
+    Dropping only ever depends on the genomes given to the race, so a race over part of the population (one shard
+    of a worker pool) is just as safe.
+    """
+    def __init__(self, genomes, protection, fitness_threshold, number_of_steps, dt, check_interval=30):
+        self.number_of_steps = number_of_steps
+        self.dt = dt
+        self.fitness_threshold = fitness_threshold
+        self.check_interval = check_interval  # Steps between two checks, checking every step costs more than it saves
+
+        # Indices of the genomes of each species, with how many places that species protects
+        self.species = {}
+        for i, genome in enumerate(genomes):
+            species_id, protected = protection.get(genome.key, (None, math.inf))
+            self.species.setdefault(species_id, (protected, []))[1].append(i)
+
+        self.active = set(range(len(genomes)))
+        self.dropped = 0
+        self.steps_saved = 0
+
+    def losers(self, step, fitnesses):
+        """
+        Called after the fitness accounting of `step`. Returns the indices of the still active genomes that cannot
+        win anymore, which are no longer active afterwards, and counts the steps saved by not simulating them.
+        """
+        remaining_steps = self.number_of_steps - step - 1
+        if remaining_steps == 0 or (step + 1) % self.check_interval != 0:
+            return []
+
+        losers = []
+        margin = remaining_steps * self.dt + 1e-9  # Rounding of the fitness sums must not make a winner look like a loser
+        for protected, members in self.species.values():
+            if len(members) <= protected:
+                continue
+            # Fitness values only grow, so the current ones are lower bounds of the final ones
+            lower_bounds = sorted((fitnesses[i] for i in members), reverse=True)
+            kth_best = lower_bounds[protected - 1]
+            for i in members:
+                upper_bound = fitnesses[i] + margin
+                if i in self.active and upper_bound < kth_best and upper_bound < self.fitness_threshold:
+                    losers.append(i)
+
+        self.active.difference_update(losers)
+        self.dropped += len(losers)
+        self.steps_saved += len(losers) * remaining_steps
+        return losers
+
+class RacingReporter(neat.reporting.BaseReporter):
+    """
+    Works out which species places each genome competes for at the start of every generation, and reports how
+    many genomes the races dropped and how many pendulum steps that saved.
+    """
+    def __init__(self, species_set, reproduction_config):
+        self.species_set = species_set
+        self.elitism = reproduction_config.elitism
+        self.survival_threshold = reproduction_config.survival_threshold
+        self.protection = {}
+        self.total_steps_saved = 0
+        self.total_steps = 0
+        self.reset()
+
+    def reset(self):
+        self.dropped = 0
+        self.steps_saved = 0
+        self.steps = 0
+
+    def start_generation(self, generation):
+        self.reset()
+        # Same counts as DefaultReproduction.reproduce: the elites and the parents of the next generation
+        self.protection = {}
+        for species_id, species in self.species_set.species.items():
+            size = len(species.members)
+            survivors = max(int(math.ceil(self.survival_threshold * size)), 2)
+            protected = max(min(self.elitism, size), survivors)
+            for genome_id in species.members:
+                self.protection[genome_id] = (species_id, protected)
+
+    def record(self, dropped, steps_saved, steps):
+        """Adds the outcome of a race over `steps` pendulum steps (population size times steps per episode)."""
+        self.dropped += dropped
+        self.steps_saved += steps_saved
+        self.steps += steps
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.total_steps_saved += self.steps_saved
+        self.total_steps += self.steps
+        if self.steps:
+            print(f"Racing: dropped {self.dropped} genomes, saved {self.steps_saved} of {self.steps} pendulum steps "
+                  f"({100 * self.steps_saved / self.steps:.1f}%, {100 * self.total_steps_saved / self.total_steps:.1f}% overall)")
@@ -0,0 +1,94 @@
+import pygame
+import argparse
+import os
+from commons import CONTROL_RATE, WIDTH, HEIGHT, draw_pendulum
+from trajectory_log import TrajectoryLog
+
+# Configuration
+FPS = CONTROL_RATE  # One recorded control tick per frame plays the episodes back in real time
+
+def draw_frame(window, font, episode, columns, row, paused):
+    pivot = (float(columns["pivot_x"][row]), HEIGHT/2)
+    bob = (float(columns["bob_x"][row]), float(columns["bob_y"][row]))
+
+    window.fill((240, 240, 240))  # Light gray background
+    draw_pendulum(window, pivot, bob)
+
+    label = episode["source"] if episode["generation"] is None else f"{episode['source']}, generation {episode['generation']}"
+    fitness = "-" if episode["fitness"] is None else f"{episode['fitness']:.2f}"
+    info_text = [
+        f"Episode: {label}",
+        f"Fitness: {fitness}",
+        f"Time: {columns['step'][row] / CONTROL_RATE:.2f} s" + ("  (paused)" if paused else ""),
+        f"Pivot X: {columns['sensor_pivot_x'][row]:.2f}",
+        f"Angle: {columns['sensor_angle'][row]:.2f}",
+        f"Angular Velocity: {columns['sensor_angular_velocity'][row]:.2f}",
+        f"Move Speed: {columns['output'][row] * 5:.2f}",
+    ]
+    for i, text in enumerate(info_text):
+        window.blit(font.render(text, True, (0, 0, 0)), (10, 10 + i * 25))
+
+    keys_text = font.render("Space: pause  ← →: seek  ↑ ↓: episode  R: reload  Esc: exit", True, (80, 80, 80))
+    window.blit(keys_text, (20, HEIGHT - 35))
+
+def play(window, clock, log, index=-1):
+    """Plays the episodes of `log` straight from its memory-mapped columns, starting at episode `index`."""
+    font = pygame.font.SysFont("Arial", 22)
+    index = index % len(log)
+    episode, columns = log.episode(index)
+    row = 0
+    paused = False
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                elif event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_LEFT:
+                    row = max(0, row - CONTROL_RATE)  # One second back
+                elif event.key == pygame.K_RIGHT:
+                    row = min(episode["length"] - 1, row + CONTROL_RATE)  # One second forward
+                elif event.key in (pygame.K_UP, pygame.K_DOWN, pygame.K_r):
+                    if event.key == pygame.K_r:
+                        log.refresh()  # Pick up the episodes a running training appended
+                    else:
+                        index = (index + (1 if event.key == pygame.K_UP else -1)) % len(log)
+                    episode, columns = log.episode(index)
+                    row = min(row, episode["length"] - 1)
+
+        draw_frame(window, font, episode, columns, row, paused)
+        pygame.display.update()
+        clock.tick(FPS)
+
+        if not paused:
+            row = (row + 1) % episode["length"]
+
+def main():
+    local_dir = os.path.dirname(__file__)
+    parser = argparse.ArgumentParser(description="Replay recorded pendulum episodes")
+    parser.add_argument("--log", default=os.path.join(local_dir, 'trajectories'), help="trajectory log directory")
+    parser.add_argument("--episode", type=int, default=-1, help="episode to start with, negative counts from the end")
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.log, "meta.json")):
+        print(f"Error: no trajectory log found at {args.log}")
+        print("Record one with 'train.py --record' or 'AI_control.py --record'")
+        return
+    log = TrajectoryLog(args.log)
+    if len(log) == 0:
+        print("The trajectory log has no episodes yet")
+        return
+
+    pygame.init()
+    window = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Pendulum Replay")
+    play(window, pygame.time.Clock(), log, args.episode)
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import math
+import random
+import numpy as np
+from commons import WIDTH, HEIGHT
+
+# Range of the perturbations drawn by `sample_scenarios`
+MAX_ANGLE = math.pi / 4  # Radians away from hanging straight down
+MAX_ANGULAR_VELOCITY = 2.0  # Radians per second
+MAX_PIVOT_OFFSET = 100  # Pixels away from the centre
+MAX_IMPULSE = 150  # Horizontal velocity change of the bob, in pixels per second
+
+AGGREGATIONS = ("mean", "min", "quantile")
+
+class Scenario:
+    """
+    One start state of an episode, given relative to the unperturbed one (bob hanging still under a centred pivot),
+    and the kicks the bob receives during the episode.
+    """
+    def __init__(self, angle=0.0, angular_velocity=0.0, pivot_offset=0.0, impulses=()):
+        self.angle = angle  # Radians, counterclockwise on screen
+        self.angular_velocity = angular_velocity  # Radians per second, counterclockwise on screen
+        self.pivot_offset = pivot_offset  # Pixels, positive to the right
+        self.impulses = tuple(impulses)  # (step, horizontal velocity change of the bob) pairs
+
+    def initial_state(self, length):
+        """Pivot x, bob position and bob velocity at the start of the episode, for a pendulum of `length`."""
+        pivot_x = WIDTH/2 + self.pivot_offset
+        sin, cos = math.sin(self.angle), math.cos(self.angle)
+        bob_position = (pivot_x + length * sin, HEIGHT/2 + length * cos)
+        bob_velocity = (self.angular_velocity * length * cos, -self.angular_velocity * length * sin)
+        return pivot_x, bob_position, bob_velocity
+
+    def apply(self, pendulum):
+        """Moves a `commons.Pendulum` in its initial state to the start state of this scenario."""
+        pivot_x, bob_position, bob_velocity = self.initial_state(pendulum.pendulum_length)
+        pendulum.pivot_body.position = (pivot_x, pendulum.pivot_body.position.y)
+        pendulum.bob_body.position = bob_position
+        pendulum.bob_body.velocity = bob_velocity
+
+    def apply_batch(self, pendulums, rows):
+        """Same as `apply` for the `rows` (a slice) of a `commons.PendulumBatch`."""
+        pivot_x, bob_position, bob_velocity = self.initial_state(pendulums.pendulum_length)
+        pendulums.pivot_x[rows] = pivot_x
+        pendulums.bob_position[rows] = bob_position
+        pendulums.bob_velocity[rows] = bob_velocity
+
+def sample_scenarios(count, seed, number_of_steps, impulses_per_episode=1):
+    """
+    The `count` scenarios every genome is scored on. The first one is the unperturbed episode, the others perturb
+    the start state and kick the bob `impulses_per_episode` times during the middle half of the episode.
+    The same `seed` always gives the same scenarios, so all genomes, and all processes, face the same ones.
+    """
+    rng = random.Random(seed)
+    scenarios = [Scenario()]
+    for _ in range(count - 1):
+        impulses = sorted((rng.randrange(number_of_steps // 4, 3 * number_of_steps // 4 + 1),
+                           rng.uniform(-MAX_IMPULSE, MAX_IMPULSE)) for _ in range(impulses_per_episode))
+        scenarios.append(Scenario(rng.uniform(-MAX_ANGLE, MAX_ANGLE),
+                                  rng.uniform(-MAX_ANGULAR_VELOCITY, MAX_ANGULAR_VELOCITY),
+                                  rng.uniform(-MAX_PIVOT_OFFSET, MAX_PIVOT_OFFSET),
+                                  impulses))
+    return scenarios
+
+def impulse_schedule(scenarios):
+    """Maps every step with a kick to the (scenario index, velocity change) pairs applied at that step."""
+    schedule = {}
+    for s, scenario in enumerate(scenarios):
+        for step, velocity_change in scenario.impulses:
+            schedule.setdefault(step, []).append((s, velocity_change))
+    return schedule
+
+def aggregate(fitnesses, aggregation="mean", quantile=0.25):
+    """
+    Combines a (scenarios, genomes) array of fitness values into one value per genome: the mean, the minimum or
+    the `quantile` over the scenarios.
+    """
+    fitnesses = np.asarray(fitnesses, dtype=float)
+    if aggregation == "mean":
+        combined = fitnesses.mean(axis=0)
+    elif aggregation == "min":
+        combined = fitnesses.min(axis=0)
+    elif aggregation == "quantile":
+        combined = np.quantile(fitnesses, quantile, axis=0)
+    else:
+        raise ValueError(f"Unknown scenario aggregation '{aggregation}', expected one of {', '.join(AGGREGATIONS)}")
+    return combined.tolist()
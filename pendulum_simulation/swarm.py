@@ -0,0 +1,231 @@
+"""
+Swarm view: hundreds to thousands of pendulums under the trained controller at once, each from its own perturbed
+start state and kicked once during the episode, as a live picture of how robust the controller is.
+
+    python swarm.py --count 2000
+    python swarm.py --count 5000 --measure 600   # headless frame-time statistics over 600 frames
+
+The pendulums are a `PendulumBatch` driven by one `BatchedFeedForwardNetwork` call per control tick. All the
+arms are drawn as a single polyline and all the bobs with a single `blits` call of pre-rendered sprites.
+"""
+import os
+import argparse
+import gc
+import pickle
+from time import perf_counter
+import numpy as np
+import pygame
+from batch_network import BatchedFeedForwardNetwork
+from commons import CONTROL_RATE, PHYSICS_SUBSTEPS, FixedStepLoop, PendulumBatch, WIDTH, HEIGHT, step_physics
+from scenarios import impulse_schedule, sample_scenarios
+
+# Configuration
+FPS = 60
+EPISODE_TIME = 25  # Seconds of simulated time before the swarm restarts from new perturbations, as in training
+BOB_RADIUS = 5
+COLOR_BUCKETS = 16  # Bob colors, from hanging straight down (red) to balanced upright (green)
+
+class TextCache:
+    """Rendered text surfaces by (text, color), so overlays only call `font.render` when their text changes."""
+    def __init__(self, font, max_size=256):
+        self.font = font
+        self.max_size = max_size
+        self.surfaces = {}
+
+    def render(self, text, color=(0, 0, 0)):
+        surface = self.surfaces.get((text, color))
+        if surface is None:
+            if len(self.surfaces) >= self.max_size:
+                self.surfaces.clear()
+            surface = self.surfaces[(text, color)] = self.font.render(text, True, color)
+        return surface
+
+def bob_sprites(radius=BOB_RADIUS, buckets=COLOR_BUCKETS):
+    """
+    One circle sprite per color bucket, in the display format with a run-length encoded color key: about twice as
+    fast to blit as per-pixel alpha.
+    """
+    sprites = []
+    for bucket in range(buckets):
+        t = bucket / (buckets - 1)
+        color = (int(200 * (1 - t) + 40 * t), int(60 * (1 - t) + 170 * t), 60)
+        sprite = pygame.Surface((2 * radius, 2 * radius))
+        sprite.fill((255, 0, 255))
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        sprite.set_colorkey((255, 0, 255), pygame.RLEACCEL)
+        sprites.append(sprite.convert())
+    return sprites
+
+def draw_swarm(window, pivot_x, pivot_y, bob_position, sprites):
+    """Draws every arm with one `pygame.draw.lines` call and every bob with one `blits` call."""
+    count = len(pivot_x)
+    # pivot -> bob -> pivot for every pendulum, in pivot order: the segments joining two pendulums run along the
+    # rail all the pivots sit on, so the single polyline only adds the rail itself
+    order = np.argsort(pivot_x)
+    points = np.empty((count, 3, 2))
+    points[:, 0, 0] = points[:, 2, 0] = pivot_x[order]
+    points[:, 0, 1] = points[:, 2, 1] = pivot_y
+    points[:, 1] = bob_position[order]
+    pygame.draw.lines(window, (150, 150, 150), False, points.reshape(-1, 2).astype(np.int32).tolist(), 1)
+
+    # Height of the bob over the pivot, -1 hanging to 1 upright, picks its sprite
+    height = np.clip((pivot_y - bob_position[:, 1]) / 100.0, -1, 1)
+    buckets = ((height + 1) / 2 * (len(sprites) - 1)).round().astype(int)
+    corners = (bob_position - BOB_RADIUS).astype(int).tolist()
+    window.blits([(sprites[bucket], corner) for bucket, corner in zip(buckets.tolist(), corners)], doreturn=False)
+
+class Swarm:
+    """`count` pendulums on the scenarios drawn from `seed`, the first one unperturbed, under one controller."""
+    def __init__(self, network, count, seed, config, substeps=PHYSICS_SUBSTEPS):
+        self.count = count
+        self.seed = seed
+        self.substeps = substeps
+        self.batched_net = BatchedFeedForwardNetwork.from_networks([network] * count, config)
+        self.restart(seed)
+
+    def restart(self, seed):
+        self.seed = seed
+        self.step = 0
+        self.number_of_steps = int(EPISODE_TIME / (1 / CONTROL_RATE))
+        scenarios = sample_scenarios(self.count, seed, self.number_of_steps)
+        self.impulses = impulse_schedule(scenarios)
+        self.pendulums = PendulumBatch(self.count)
+        for s, scenario in enumerate(scenarios):
+            scenario.apply_batch(self.pendulums, slice(s, s + 1))
+        self.save_state()
+
+    def save_state(self):
+        self.previous_pivot_x = self.pendulums.pivot_x.copy()
+        self.previous_bob_position = self.pendulums.bob_position.copy()
+
+    def tick(self, dt):
+        """One control tick: the kicks due, one batched activation, the pivot update and the physics steps."""
+        if self.step >= self.number_of_steps:
+            self.restart(self.seed + 1)
+        self.save_state()
+        pendulums = self.pendulums
+        for s, velocity_change in self.impulses.get(self.step, ()):
+            pendulums.bob_velocity[s, 0] += velocity_change
+        move_speed = self.batched_net.activate(pendulums.get_sensory_data())[:, 0] * 5  # Same scaling as in training
+        pendulums.move_pivots(move_speed)
+        step_physics(pendulums, dt, self.substeps)
+        self.step += 1
+
+    def interpolated(self, alpha):
+        """Pivot x and bob positions between the last two ticks."""
+        pivot_x = self.previous_pivot_x + (self.pendulums.pivot_x - self.previous_pivot_x) * alpha
+        bob_position = self.previous_bob_position + (self.pendulums.bob_position - self.previous_bob_position) * alpha
+        return pivot_x, bob_position
+
+    def balanced(self):
+        """Share of the pendulums balanced upright, by the height training rewards."""
+        return float(np.mean(self.pendulums.bob_position[:, 1] < self.pendulums.pivot_y - 0.9 * self.pendulums.pendulum_length))
+
+def load_network(network_path, config_path):
+    import neat
+
+    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+    with open(network_path, 'rb') as input_file:
+        genome = pickle.load(input_file)
+    return neat.nn.FeedForwardNetwork.create(genome, config), config, genome.fitness
+
+def main(window=None, max_frames=None, count=1000, seed=0, fps=FPS, substeps=PHYSICS_SUBSTEPS):
+    """
+    With a `window`, the swarm draws on that display surface and leaves pygame initialised when it returns,
+    otherwise it opens its own window. `max_frames` ends it after that many frames and prints frame-time statistics.
+    """
+    local_dir = os.path.dirname(__file__)
+    network_path = os.path.join(local_dir, 'best_network.pkl')
+    if not os.path.exists(network_path):
+        print(f"Error: Trained network file not found at {network_path}")
+        print("Please run the training program first to generate best_network.pkl")
+        return
+    network, config, fitness = load_network(network_path, os.path.join(local_dir, 'neat_config.txt'))
+
+    own_window = window is None
+    if own_window:
+        pygame.init()
+        window = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Trained Pendulum - Swarm")
+    clock = pygame.time.Clock()
+    text = TextCache(pygame.font.SysFont("Arial", 20))
+    sprites = bob_sprites()
+
+    swarm = Swarm(network, count, seed, config, substeps)
+    loop = FixedStepLoop()
+    # Every frame allocates a few thousand short-lived point lists, which keeps triggering the garbage collector:
+    # without the long-lived objects of neat, pygame and numpy to traverse, its passes stop costing whole frames
+    gc.collect()
+    gc.freeze()
+    print(f"Swarm of {count} pendulums running... Press R for new perturbations, ESC or close window to exit.")
+
+    frame_times = []
+    frame_time = 0.0  # Moving average of the time spent on a frame, without the wait for the frame rate cap
+    overlay = []
+    overlay_updated = 0.0
+    running = True
+    while running:
+        frame_start = perf_counter()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                elif event.key == pygame.K_r:
+                    swarm.restart(swarm.seed + 1)
+
+        for _ in range(loop.ticks()):
+            swarm.tick(loop.dt)
+
+        window.fill((240, 240, 240))  # Light gray background
+        pivot_x, bob_position = swarm.interpolated(loop.alpha)
+        draw_swarm(window, pivot_x, swarm.pendulums.pivot_y, bob_position, sprites)
+
+        # The overlay values change every frame, refreshing them a few times per second keeps the text cache useful
+        now = perf_counter()
+        if now - overlay_updated > 0.25:
+            overlay_updated = now
+            overlay = [
+                f"Pendulums: {count}   Controller fitness: {fitness:.2f}",
+                f"Balanced: {swarm.balanced():.0%}   Time: {swarm.step * loop.dt:4.1f} s   Perturbation seed: {swarm.seed}",
+                f"Frame: {frame_time * 1000:4.1f} ms of {1000 / fps:.1f}   FPS: {clock.get_fps():3.0f}   Skipped: {loop.skipped_frames}",
+            ]
+        for i, line in enumerate(overlay):
+            window.blit(text.render(line), (10, 10 + i * 24))
+        window.blit(text.render("R: new perturbations   Esc: exit", (80, 80, 80)), (20, HEIGHT - 30))
+
+        pygame.display.update()
+        busy = perf_counter() - frame_start
+        frame_time = busy if not frame_time else 0.9 * frame_time + 0.1 * busy
+        clock.tick(fps)
+        if max_frames is not None:
+            frame_times.append(busy)
+            if len(frame_times) >= max_frames:
+                running = False
+
+    if frame_times:
+        frame_times = np.array(frame_times[1:] or frame_times) * 1000
+        print(f"{count} pendulums, {len(frame_times)} frames: frame time mean {frame_times.mean():.2f} ms, "
+              f"95th percentile {np.percentile(frame_times, 95):.2f} ms, max {frame_times.max():.2f} ms "
+              f"(budget {1000 / fps:.1f} ms)")
+    gc.unfreeze()
+    if own_window:
+        pygame.quit()
+    print("Simulation ended.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch the trained network balance a swarm of perturbed pendulums")
+    parser.add_argument("--count", type=int, default=1000, help="pendulums (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first perturbations (default: %(default)s)")
+    parser.add_argument("--fps", type=int, default=FPS, help="frames drawn per second at most (default: %(default)s)")
+    parser.add_argument("--substeps", type=int, default=PHYSICS_SUBSTEPS,
+                        help="physics steps per control tick, as in training (default: %(default)s)")
+    parser.add_argument("--measure", type=int, metavar="FRAMES",
+                        help="run headless, stop after FRAMES frames and print frame-time statistics")
+    args = parser.parse_args()
+    if args.measure is not None:
+        # Headless like benchmarks.py, the display is only initialised by `main`, after this
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    main(max_frames=args.measure, count=args.count, seed=args.seed, fps=args.fps, substeps=args.substeps)
@@ -0,0 +1,326 @@
+"""
+Hyperparameter sweeps: trains once for every combination of `neat_config.txt` keys, training settings and seed,
+in a pool of processes, and stores the statistics of every generation in a SQLite database.
+
+    python sweep.py run --grid pop_size=50,100 compatibility_threshold=2.5,3.0 --seeds 3
+    python sweep.py run --random 20 conn_add_prob=0.1:0.9 total_sim_time=10,25 --seeds 2
+    python sweep.py summary   # configurations ranked by time to the fitness threshold
+
+Runs are keyed by a hash of the complete configuration they train with and their seed, so running a sweep again
+skips the runs already in the database and an interrupted sweep only redoes the runs it had not finished.
+"""
+import argparse
+import ast
+import configparser
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import traceback
+import neat
+
+# Settings of train.py a sweep can vary, anything else is looked up in the NEAT configuration
+TRAINING_PARAMETERS = ("total_sim_time", "max_generations", "time_budget", "BACKEND", "BATCH_NETWORKS", "RACING",
+                       "cache_size", "PENDULUM_POOL", "PHYSICS_LITE", "solver_iterations", "scenario_count",
+                       "scenario_aggregation", "scenario_quantile", "scenario_seed", "physics_substeps")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_key TEXT PRIMARY KEY,
+    config_key TEXT NOT NULL,         -- Same for all the seeds of a configuration
+    parameters TEXT NOT NULL,         -- JSON of the values the sweep set
+    seed INTEGER NOT NULL,
+    status TEXT NOT NULL,             -- "done" or "failed", failed runs are retried by the next sweep
+    error TEXT,
+    fitness_threshold REAL,
+    generations INTEGER,
+    best_fitness REAL,
+    threshold_generation INTEGER,     -- NULL when the threshold was not reached
+    time_to_threshold REAL,           -- Wall-clock seconds, NULL when the threshold was not reached
+    elapsed REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS generations (
+    run_key TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    best_fitness REAL,
+    mean_fitness REAL,
+    stdev_fitness REAL,
+    species INTEGER,
+    elapsed REAL,
+    PRIMARY KEY (run_key, generation)
+);
+"""
+
+def parse_value(text):
+    """A Python literal when `text` is one, the string itself otherwise ("numpy", "min", ...)."""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+def parse_parameter(spec):
+    """
+    Splits "name=values" into the name and either a list of values ("a,b,c") or a (low, high) range ("low:high",
+    random search only).
+    """
+    name, separator, values = spec.partition("=")
+    if not separator or not values:
+        raise ValueError(f"Expected name=values, got '{spec}'")
+    if ":" in values:
+        low, high = (parse_value(value) for value in values.split(":", 1))
+        return name, (low, high)
+    return name, [parse_value(value) for value in values.split(",")]
+
+def grid(parameters):
+    """All the combinations of the value lists of `parameters`, a dict of name -> values."""
+    for name, values in parameters.items():
+        if isinstance(values, tuple):
+            raise ValueError(f"'{name}' is a range, a grid needs a list of values")
+    names = list(parameters)
+    return [dict(zip(names, combination)) for combination in itertools.product(*parameters.values())]
+
+def random_search(parameters, count, seed=0):
+    """
+    `count` combinations drawn at random: a value of each list, an integer or float uniformly from each range
+    depending on its bounds.
+    """
+    rng = random.Random(seed)
+    combinations = []
+    for _ in range(count):
+        combination = {}
+        for name, values in parameters.items():
+            if isinstance(values, list):
+                combination[name] = rng.choice(values)
+            elif all(isinstance(bound, int) for bound in values):
+                combination[name] = rng.randint(*values)
+            else:
+                combination[name] = rng.uniform(*values)
+        combinations.append(combination)
+    return combinations
+
+def configure(base_config_path, combination):
+    """
+    Splits a combination into the training settings and the NEAT configuration text it trains with.
+    NEAT keys are given by name, or as "Section.key" when the name alone is ambiguous.
+    """
+    import train
+
+    parser = configparser.ConfigParser()
+    parser.read(base_config_path)
+    training = {name: getattr(train, name) for name in TRAINING_PARAMETERS}
+    for name, value in combination.items():
+        if name in TRAINING_PARAMETERS:
+            training[name] = value
+            continue
+        section, _, key = name.rpartition(".")
+        sections = [section] if section else [section for section in parser.sections() if parser.has_option(section, name)]
+        if len(sections) != 1 or not parser.has_option(sections[0], key):
+            raise ValueError(f"'{name}' is neither a training setting nor a single key of '{base_config_path}'")
+        parser.set(sections[0], key, str(value))
+
+    config_text = io.StringIO()
+    parser.write(config_text)
+    return training, config_text.getvalue()
+
+def config_key(training, config_text):
+    """Hash of everything a run depends on but its seed."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(sorted(training.items())).encode())
+    h.update(config_text.encode())
+    return h.hexdigest()
+
+def run_key(config_key, seed):
+    return hashlib.blake2b(f"{config_key}:{seed}".encode(), digest_size=16).hexdigest()
+
+class SweepReporter(neat.reporting.BaseReporter):
+    """Statistics of every generation of a run, and when it reached the fitness threshold."""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.generation = None
+        self.generations = []
+        self.threshold_generation = None
+        self.time_to_threshold = None
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        fitnesses = [genome.fitness for genome in population.values()]
+        self.generations.append((self.generation, best_genome.fitness, neat.math_util.mean(fitnesses),
+                                 neat.math_util.stdev(fitnesses), len(species.species),
+                                 time.perf_counter() - self.start))
+
+    def found_solution(self, config, generation, best):
+        if self.threshold_generation is None:
+            self.threshold_generation = generation
+            self.time_to_threshold = time.perf_counter() - self.start
+
+def _run(task):
+    """
+    One training run, in a pool process of its own. Its output is discarded, and whatever happens a result is
+    returned for the parent to store, which keeps the database single-writer.
+    """
+    key, configuration_key, combination, seed, training, config_text = task
+    result = {"run_key": key, "config_key": configuration_key, "parameters": json.dumps(combination, sort_keys=True),
+              "seed": seed, "status": "done", "error": None, "generations": []}
+    start = time.perf_counter()
+    try:
+        import train
+
+        for name, value in training.items():
+            setattr(train, name, value)
+        random.seed(seed)
+        reporter = SweepReporter()
+        with tempfile.TemporaryDirectory() as directory:
+            config_path = os.path.join(directory, "neat_config.txt")
+            with open(config_path, "w") as config_file:
+                config_file.write(config_text)
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                train.run(config_path, os.path.join(directory, "best_network.pkl"), workers=1, reporters=[reporter])
+            config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                        neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+        result.update({
+            "fitness_threshold": config.fitness_threshold,
+            "generations": reporter.generations,
+            "best_fitness": max(row[1] for row in reporter.generations),
+            "threshold_generation": reporter.threshold_generation,
+            "time_to_threshold": reporter.time_to_threshold,
+        })
+    except Exception:
+        result.update({"status": "failed", "error": traceback.format_exc()})
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+def open_database(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+def store(connection, result):
+    """Writes a run and its generations in one transaction, replacing an earlier failed attempt."""
+    with connection:
+        connection.execute("DELETE FROM generations WHERE run_key = ?", (result["run_key"],))
+        connection.execute(
+            "INSERT OR REPLACE INTO runs (run_key, config_key, parameters, seed, status, error, fitness_threshold, "
+            "generations, best_fitness, threshold_generation, time_to_threshold, elapsed, finished_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (result["run_key"], result["config_key"], result["parameters"], result["seed"], result["status"],
+             result["error"], result.get("fitness_threshold"), len(result["generations"]), result.get("best_fitness"),
+             result.get("threshold_generation"), result.get("time_to_threshold"), result["elapsed"], time.time()))
+        connection.executemany(
+            "INSERT INTO generations (run_key, generation, best_fitness, mean_fitness, stdev_fitness, species, elapsed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(result["run_key"], *row) for row in result["generations"]])
+
+def sweep(database_path, base_config_path, combinations, seeds, processes=None):
+    """
+    Trains every combination with every seed, `processes` runs at a time, skipping the runs the database already
+    holds. Returns the number of runs done now.
+    """
+    connection = open_database(database_path)
+    done = {row[0] for row in connection.execute("SELECT run_key FROM runs WHERE status = 'done'")}
+    tasks = []
+    for combination in combinations:
+        training, config_text = configure(base_config_path, combination)
+        configuration_key = config_key(training, config_text)
+        for seed in seeds:
+            key = run_key(configuration_key, seed)
+            if key not in done:
+                tasks.append((key, configuration_key, combination, seed, training, config_text))
+                done.add(key)  # The same combination drawn twice is trained once
+    print(f"{len(combinations) * len(seeds)} runs, {len(tasks)} left to do")
+
+    # One run per process: train.py keeps its settings and population state in module globals
+    pool = multiprocessing.Pool(processes or os.cpu_count(), maxtasksperchild=1)
+    try:
+        for finished, result in enumerate(pool.imap_unordered(_run, tasks), 1):
+            store(connection, result)
+            if result["status"] == "done":
+                reached = "not reached" if result["time_to_threshold"] is None else f"reached in {result['time_to_threshold']:.1f} s"
+                print(f"[{finished}/{len(tasks)}] {result['parameters']} seed {result['seed']}: "
+                      f"best fitness {result['best_fitness']:.2f}, threshold {reached}")
+            else:
+                print(f"[{finished}/{len(tasks)}] {result['parameters']} seed {result['seed']} failed:\n{result['error']}")
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        connection.close()
+    return len(tasks)
+
+RANKING = """
+SELECT parameters, COUNT(*) AS runs, COUNT(time_to_threshold) AS reached, AVG(time_to_threshold) AS mean_time,
+       AVG(threshold_generation) AS mean_generations, AVG(best_fitness) AS mean_best, MAX(best_fitness) AS best
+FROM runs
+WHERE status = 'done'
+GROUP BY config_key
+ORDER BY CAST(reached AS REAL) / runs DESC, mean_time IS NULL, mean_time, mean_best DESC
+LIMIT ?
+"""
+
+def summary(database_path, limit=20):
+    """
+    Configurations ranked by the share of their runs that reached the fitness threshold, then by the mean
+    wall-clock time those runs took to reach it, then by mean best fitness.
+    """
+    connection = open_database(database_path)
+    rows = connection.execute(RANKING, (limit,)).fetchall()
+    failed = connection.execute("SELECT COUNT(*) FROM runs WHERE status = 'failed'").fetchone()[0]
+    connection.close()
+
+    print(f"{'rank':>4}  {'reached':>7}  {'mean time':>9}  {'generations':>11}  {'mean best':>9}  {'best':>7}  parameters")
+    for rank, (parameters, runs, reached, mean_time, mean_generations, mean_best, best) in enumerate(rows, 1):
+        time_text = "-" if mean_time is None else f"{mean_time:.1f} s"
+        generations_text = "-" if mean_generations is None else f"{mean_generations:.1f}"
+        print(f"{rank:>4}  {f'{reached}/{runs}':>7}  {time_text:>9}  {generations_text:>11}  {mean_best:>9.2f}  {best:>7.2f}  {parameters}")
+    if failed:
+        print(f"{failed} failed run(s) not ranked, the next sweep retries them")
+
+def main():
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Sweep NEAT and training hyperparameters and rank the results")
+    parser.add_argument("--database", default=os.path.join(local_dir, "sweep.db"),
+                        help="SQLite database of the results (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="train every configuration of a grid or random search")
+    run_parser.add_argument("parameters", nargs="+", metavar="NAME=VALUES",
+                            help="a neat_config.txt key or train.py setting and its values, 'a,b,c' or 'low:high'")
+    search = run_parser.add_mutually_exclusive_group()
+    search.add_argument("--grid", action="store_true", help="every combination of the values (the default)")
+    search.add_argument("--random", type=int, metavar="N", help="N combinations drawn at random")
+    run_parser.add_argument("--sample-seed", type=int, default=0, help="seed of the random search (default: %(default)s)")
+    run_parser.add_argument("--seeds", type=int, default=1, help="training seeds per configuration (default: %(default)s)")
+    run_parser.add_argument("--processes", type=int, help="runs at a time (default: the number of CPUs)")
+    run_parser.add_argument("--config", default=os.path.join(local_dir, "neat_config.txt"),
+                            help="NEAT configuration the values are applied to (default: %(default)s)")
+
+    summary_parser = commands.add_parser("summary", help="rank the configurations by time to the fitness threshold")
+    summary_parser.add_argument("--limit", type=int, default=20, help="configurations shown (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        summary(args.database, args.limit)
+        return
+    try:
+        parameters = dict(parse_parameter(spec) for spec in args.parameters)
+        if args.random is not None:
+            combinations = random_search(parameters, args.random, args.sample_seed)
+        else:
+            combinations = grid(parameters)
+        for combination in combinations:
+            configure(args.config, combination)
+    except ValueError as e:
+        parser.error(str(e))
+    sweep(args.database, args.config, combinations, range(args.seeds), args.processes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Streaming training telemetry: one JSON line per generation, appended to a file by a background thread, and a
+reader that follows the file while training runs.
+
+    python train.py --telemetry            # appends to telemetry.jsonl
+    python telemetry.py --follow           # prints every generation as it is written
+    python telemetry.py --follow --plot    # live chart of the fitness and the simulation throughput
+
+Every training run starts with a "run" record: the printed table starts over with a new header, the chart is cleared.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from time import perf_counter
+import numpy as np
+import neat
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+class TelemetryReporter(neat.reporting.BaseReporter):
+    """
+    Appends a record of every generation to `path`: the fitness distribution, the species sizes, the genome
+    complexity, the evaluation wall time and the pendulum steps simulated per second. Nothing is kept once a
+    record is written, unlike `neat.StatisticsReporter`, so memory stays the same however long training runs.
+
+    Records go through a queue of `max_pending` to a background thread that writes them buffered and flushes
+    whenever it has caught up, so a reader following the file sees every generation as soon as it is done.
+    `steps` is a callable returning the pendulum steps simulated so far, None leaves the throughput out.
+    The file is opened right away, so a bad path fails before training starts. An error that stops the writer
+    later is raised again by the next generation's record and by `close`.
+    """
+    def __init__(self, path, steps=None, max_pending=64):
+        self.path = path
+        self.steps = steps
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.start = perf_counter()
+        self.generation = None
+        self.generation_start = None
+        self.steps_at_start = 0
+        self.output = open(path, "a")
+        self.error = None
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+        self.pending.put({"type": "run", "time": time.time()})
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.generation_start = perf_counter()
+        self.steps_at_start = self.steps() if self.steps is not None else 0
+
+    def post_evaluate(self, config, population, species, best_genome):
+        evaluation_seconds = perf_counter() - self.generation_start
+        fitnesses = np.array([genome.fitness for genome in population.values()], dtype=float)
+        sizes = np.array([genome.size() for genome in population.values()])  # (nodes, enabled connections)
+        record = {
+            "type": "generation",
+            "generation": self.generation,
+            "time": time.time(),
+            "elapsed": perf_counter() - self.start,
+            "evaluation_seconds": evaluation_seconds,
+            "population": len(fitnesses),
+            "fitness": {
+                "min": float(fitnesses.min()),
+                "max": float(fitnesses.max()),
+                "mean": float(fitnesses.mean()),
+                "stdev": float(fitnesses.std()),
+                "quantiles": dict(zip((str(q) for q in QUANTILES), np.quantile(fitnesses, QUANTILES).tolist())),
+            },
+            "species": [[key, len(s.members), max(genome.fitness for genome in s.members.values())]
+                        for key, s in sorted(species.species.items())],
+            "complexity": {
+                "nodes_mean": float(sizes[:, 0].mean()),
+                "nodes_max": int(sizes[:, 0].max()),
+                "connections_mean": float(sizes[:, 1].mean()),
+                "connections_max": int(sizes[:, 1].max()),
+            },
+            "best": {"key": best_genome.key, "fitness": best_genome.fitness, "size": list(best_genome.size())},
+        }
+        if self.steps is not None:
+            steps = self.steps() - self.steps_at_start
+            record["steps"] = steps
+            record["steps_per_second"] = steps / evaluation_seconds if evaluation_seconds > 0 else 0.0
+        self._put(record)  # Blocks only if the disk is behind by `max_pending` generations
+
+    def _put(self, item):
+        # A writer that died leaves its queue full, only wait for room while it can still make some
+        while self.writer.is_alive():
+            try:
+                self.pending.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        if self.error is not None:
+            raise self.error
+
+    def _write_loop(self):
+        try:
+            with self.output:
+                while True:
+                    record = self.pending.get()
+                    if record is None:
+                        return
+                    self.output.write(json.dumps(record) + "\n")
+                    if self.pending.empty():
+                        self.output.flush()
+        except Exception as error:
+            self.error = error
+
+    def close(self):
+        """Waits until every record is on disk and stops the writer, then raises the error that stopped it."""
+        self._put(None)
+        self.writer.join()
+        if self.error is not None:
+            raise self.error
+
+class TelemetryTail:
+    """Reads the records appended to a telemetry file since the last call, without blocking."""
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.partial = ""  # Start of a record still being written
+
+    def poll(self):
+        if self.file is None:
+            if not os.path.exists(self.path):
+                return []
+            self.file = open(self.path)
+        records = []
+        while True:
+            line = self.file.readline()
+            if not line:
+                return records
+            self.partial += line
+            if self.partial.endswith("\n"):
+                records.append(json.loads(self.partial))
+                self.partial = ""
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+def format_record(record):
+    fitness = record["fitness"]
+    throughput = f"{record['steps_per_second']:>10.0f}" if "steps_per_second" in record else f"{'-':>10}"
+    return (f"{record['generation']:>4}  {fitness['max']:>7.2f}  {fitness['mean']:>7.2f}  {fitness['quantiles']['0.5']:>7.2f}"
+            f"  {len(record['species']):>7}  {record['complexity']['nodes_mean']:>5.1f}  {record['complexity']['connections_mean']:>5.1f}"
+            f"  {record['evaluation_seconds']:>7.2f}  {throughput}")
+
+HEADER = (f"{'gen':>4}  {'best':>7}  {'mean':>7}  {'median':>7}  {'species':>7}  {'nodes':>5}  {'conns':>5}"
+          f"  {'eval s':>7}  {'steps/s':>10}")
+
+def print_records(path, follow=False, poll_interval=0.5):
+    """Prints the generations of `path`, and with `follow` keeps printing the new ones until interrupted."""
+    tail = TelemetryTail(path)
+    try:
+        while True:
+            for record in tail.poll():
+                if record["type"] == "run":
+                    print(f"\nRun started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['time']))}")
+                    print(HEADER)
+                else:
+                    print(format_record(record), flush=True)
+            if not follow:
+                break
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tail.close()
+
+def plot(path, history=500, fps=10):
+    """Live chart of the last `history` generations of the last run in `path`: fitness above, steps/sec below."""
+    import pygame
+    from commons import WIDTH, HEIGHT
+
+    pygame.init()
+    window = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Training - Telemetry")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont("Arial", 18)
+    tail = TelemetryTail(path)
+    records = deque(maxlen=history)
+    series = (("best", (200, 60, 60), lambda r: r["fitness"]["max"]),
+              ("median", (70, 130, 180), lambda r: r["fitness"]["quantiles"]["0.5"]),
+              ("mean", (120, 120, 120), lambda r: r["fitness"]["mean"]))
+    panels = ((pygame.Rect(70, 40, WIDTH - 100, 330), series),
+              (pygame.Rect(70, 420, WIDTH - 100, 140), (("steps/s", (60, 140, 60), lambda r: r.get("steps_per_second", 0.0)),)))
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                running = False
+        for record in tail.poll():
+            if record["type"] == "run":
+                records.clear()
+            else:
+                records.append(record)
+
+        window.fill((240, 240, 240))
+        for rect, lines in panels:
+            pygame.draw.rect(window, (255, 255, 255), rect)
+            pygame.draw.rect(window, (80, 80, 80), rect, 1)
+            if not records:
+                continue
+            values = [[value(record) for record in records] for _, _, value in lines]
+            low = min(min(v) for v in values)
+            high = max(max(v) for v in values)
+            high = high if high > low else low + 1
+            first, last = records[0]["generation"], records[-1]["generation"]
+            span = max(last - first, 1)
+            for (label, color, _), v in zip(lines, values):
+                points = [(rect.left + (record["generation"] - first) / span * rect.width,
+                           rect.bottom - (value - low) / (high - low) * rect.height) for record, value in zip(records, v)]
+                if len(points) > 1:
+                    pygame.draw.lines(window, color, False, points, 2)
+            window.blit(font.render(f"{high:.4g}", True, (0, 0, 0)), (5, rect.top))
+            window.blit(font.render(f"{low:.4g}", True, (0, 0, 0)), (5, rect.bottom - 18))
+            legend = "   ".join(label for label, _, _ in lines)
+            window.blit(font.render(f"{legend}   (generations {first}-{last})", True, (0, 0, 0)), (rect.left, rect.top - 22))
+        if records:
+            latest = records[-1]
+            text = f"Generation {latest['generation']}   best {latest['fitness']['max']:.2f}   species {len(latest['species'])}"
+            window.blit(font.render(text, True, (0, 0, 0)), (70, HEIGHT - 30))
+
+        pygame.display.update()
+        clock.tick(fps)
+    tail.close()
+    pygame.quit()
+
+def main():
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Show the training telemetry, live while training runs")
+    parser.add_argument("path", nargs="?", default=os.path.join(local_dir, "telemetry.jsonl"),
+                        help="telemetry file (default: %(default)s)")
+    parser.add_argument("--follow", action="store_true", help="keep reading the generations appended to the file")
+    parser.add_argument("--plot", action="store_true", help="draw a live chart instead of printing")
+    parser.add_argument("--history", type=int, default=500, help="generations shown by the chart (default: %(default)s)")
+    args = parser.parse_args()
+    if args.plot:
+        plot(args.path, args.history)
+    else:
+        print_records(args.path, args.follow)
+
+if __name__ == "__main__":
+    main()
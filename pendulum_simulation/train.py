@@ -1,78 +1,219 @@
-import pymunk
 import neat
 import pickle
 import os
-from commons import Pendulum, WIDTH, HEIGHT
+import argparse
+import multiprocessing
+import numpy as np
+from time import perf_counter
+from batch_network import BatchedFeedForwardNetwork
+from budget import TimeBudget, run_until_deadline
+from checkpoint import BestGenomeExporter, Checkpointer, restore_population, write_atomically
+from distributed import RemoteEvaluator, config_digest, parse_address
+from export_controller import export
+from genome_cache import GenomeCache
+from islands import TOPOLOGIES, run_islands
+from profiling import PhaseProfiler
+from racing import Race, RacingReporter
+from scenarios import AGGREGATIONS, aggregate, impulse_schedule, sample_scenarios
+from telemetry import TelemetryReporter
+from trajectory_log import TrajectoryRecorder
+from viewer import TrainingViewer
+from commons import CONTROL_RATE, PHYSICS_SUBSTEPS, SOLVER_ITERATIONS, Pendulum, PendulumBatch, WIDTH, make_space, step_physics
 
-DRAW = False
+DRAW = False  # Show the best genomes live in a separate viewer process
 total_sim_time = 25  # virtual simulation time in seconds
 max_generations = 20
+time_budget = None  # Wall-clock seconds the training may take, replacing max_generations, None runs max_generations
+budget_window = 5  # Recent generations whose slowest sets the expected duration of the next one, with a time budget
+BACKEND = "pymunk"  # "pymunk" or "numpy" (PendulumBatch, the whole population stepped at once)
+BATCH_NETWORKS = False  # Activate the whole population with one BatchedFeedForwardNetwork call per step
+RACING = False  # Stop simulating genomes that can no longer survive or reach the fitness threshold (pymunk backend, one scenario)
+cache_size = 1000  # Genomes whose fitness and network are kept by content hash, 0 disables the cache
+PROFILE = False  # Print how each generation's evaluation time splits into simulation phases
+RECORD_TRAJECTORIES = False  # Append an episode of every generation's best genome to the trajectory log
+PENDULUM_POOL = True  # Reuse the pendulums of previous episodes instead of creating new ones every generation
+PHYSICS_LITE = True  # Pendulums without collision shapes, which nothing in training collides with: same results, no broadphase
+solver_iterations = SOLVER_ITERATIONS  # Solver iterations of the training spaces, 1 is faster but not bit-identical (see commons.make_space)
+scenario_count = 1  # Perturbed start states every genome runs in the same pass, 1 keeps the single unperturbed episode
+scenario_aggregation = "mean"  # How the fitness values of a genome's scenarios combine: "mean", "min" or "quantile"
+scenario_quantile = 0.25  # Quantile taken with the "quantile" aggregation
+scenario_seed = 0  # Seed of the scenarios, which stay the same for every genome and generation
+physics_substeps = PHYSICS_SUBSTEPS  # Physics steps per control tick, run the trained controller with the same number
+checkpoint_interval = 1  # Generations between two checkpoints, when checkpointing
+num_workers = 1  # Processes used to evaluate genomes, 1 keeps the evaluation in this process
+island_count = 1  # Populations evolved side by side in processes of their own, 1 trains a single population
+migration_interval = 5  # Generations between two exchanges of genomes between islands
+migrant_count = 2  # Fittest genomes every island sends to each of its neighbours
+migration_topology = "ring"  # "ring" sends migrants to the next island, "full" to all the others
+remote_batch_size = 10  # Genomes sent to a remote evaluation worker at a time
+remote_timeout = 120  # Seconds a remote worker has to return a batch before it is dropped and the batch re-queued
+viewer_fps = 30  # Frames per second sent to the viewer at most
+viewer_genomes = 10  # Pendulums shown by the viewer
+viewer_selection = "top"  # "top" shows the best genomes so far, "sample" a random subset
 
-if DRAW:
-    import pygame
-    import pymunk.pygame_util
-
-space = pymunk.Space()
-space.gravity = (0, 981)
+space = make_space(solver_iterations)
 
 generation = 0     
+genome_cache = None # GenomeCache of the running population, when cache_size > 0
+phase_profiler = None # PhaseProfiler timing the phases of the simulation, None keeps it out of the loop
+racing = None # RacingReporter of the running population, when RACING is on
+viewer = None # TrainingViewer of the running training, when DRAW is on
+pendulum_pools = {} # Pendulums of every space, reused across episodes when PENDULUM_POOL is on
+scenario_spaces = [] # Spaces of the scenarios after the first one, which runs in the space given to `simulate`
+remote_evaluator = None # RemoteEvaluator handing the genomes to workers on other machines, when listening
+simulated_steps = 0 # Pendulum steps simulated so far, in this process or for it, read by the telemetry
+worker_pool = None
+worker_pool_size = 0
+_worker_config = None
 
-def fitness_function(population, config):
+def take_pendulums(space, count):
     """
-    This function is solely for the use of the python NEAT library.
+    Returns `count` pendulums in their initial state inside `space`. With PENDULUM_POOL on, the pendulums of previous
+    episodes are reset and reused: the pool of a space grows to the largest episode once, and pooled pendulums that
+    are not needed leave the space so they don't get simulated.
+    """
+    if not PENDULUM_POOL:
+        return [Pendulum(space, collision_shape=not PHYSICS_LITE) for _ in range(count)]
 
-    Arguments:
-        - The population as a list of (genome id, genome) tuples.
-        - The current configuration object.
+    pool = pendulum_pools.setdefault(space, [])
+    while len(pool) < count:
+        pendulum = Pendulum(space, collision_shape=not PHYSICS_LITE)
+        space.remove(*pendulum.everything_in_space)
+        pool.append(pendulum)
+    for i, pendulum in enumerate(pool):
+        in_space = pendulum.bob_body.space is not None
+        if i < count:
+            pendulum.reset()
+            if not in_space:
+                space.add(*pendulum.everything_in_space)
+        elif in_space:
+            space.remove(*pendulum.everything_in_space)
+    return pool[:count]
 
-    The return value of the fitness function is ignored, but it must assign a Python float to the fitness member of each genome.
-    The fitness function is free to maintain external state, perform evaluations in parallel, etc.
-    It is assumed that fitness_function does not modify the list of genomes, the genomes themselves (apart from updating the fitness member), or the configuration object.
+def release_pendulums(space, pendulums):
+    """End of an episode: pooled pendulums stay in the space for the next one, the others are removed."""
+    if not PENDULUM_POOL:
+        for pendulum in pendulums:
+            space.remove(*pendulum.everything_in_space)
+
+def episode_scenarios():
+    """The scenarios every genome is evaluated on, None for the single unperturbed episode."""
+    if scenario_count <= 1:
+        return None
+    return sample_scenarios(scenario_count, scenario_seed, int(total_sim_time / (1 / CONTROL_RATE)))
+
+def spaces_for_scenarios(space, count):
     """
-    if DRAW:
-        pygame.init() # Consider not renewing the pygame window each generation. 
-        window = pygame.display.set_mode((WIDTH, HEIGHT))
-        clock = pygame.time.Clock()
-        generation_font = pygame.font.SysFont("Arial", 24)
-        draw_options = pymunk.pygame_util.DrawOptions(window)
-    
-    neural_nets = [] # Phenotypes
-    genomes = []
-    pendulums = []
+    `space` followed by the spaces of the other scenarios, `count` in all. Every scenario gets a space of its own:
+    the pendulums never interact, but the broadphase of a space still pairs up all the bobs that overlap, which
+    grows with the square of the pendulums in it.
+    """
+    while len(scenario_spaces) < count - 1:
+        scenario_spaces.append(make_space(solver_iterations))
+    return [space] + scenario_spaces[:count - 1]
 
-    for genome_id, genome in population:
-        neural_nets.append(neat.nn.FeedForwardNetwork.create(genome, config))
-        pendulums.append(Pendulum(space))
-        genome.fitness = 0
-        genomes.append(genome)
+def simulate(genomes, config, space, race=None, neural_nets=None):
+    """
+    Runs one episode for every genome in `genomes` inside `space` and returns their fitness values, in the same order.
+    The genomes themselves are not modified.
+    With a `racing.Race`, genomes that can no longer win stop being simulated and their pendulums leave the space.
+    `neural_nets` are the phenotypes of the genomes, when they have already been created.
+    With `scenario_count` above 1, every genome runs all the scenarios of `episode_scenarios` in the same stepping
+    pass, and its fitness is the `scenario_aggregation` of its scenario fitnesses.
+    """
+    timing = phase_profiler is not None
+    if timing:
+        t0 = perf_counter()
+    if neural_nets is None:
+        neural_nets = [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+    if timing:
+        phase_profiler.add("network creation", perf_counter() - t0)
 
-    # Main game:
-    global generation
-    generation += 1
-    
-    fps = 60
-    dt = 1 / fps
+    if BACKEND == "numpy":
+        return simulate_batch(genomes, config, neural_nets)
+
+    if timing:
+        t0 = perf_counter()
+    scenarios = episode_scenarios()
+    population_size = len(genomes)
+    if scenarios is None:
+        spaces = [space]
+        pendulums = take_pendulums(space, population_size)
+    else:
+        # Scenario s drives pendulums s * population_size to (s + 1) * population_size - 1 with the same networks
+        spaces = spaces_for_scenarios(space, len(scenarios))
+        pendulums = []
+        for scenario, scenario_space in zip(scenarios, spaces):
+            scenario_pendulums = take_pendulums(scenario_space, population_size)
+            for pendulum in scenario_pendulums:
+                scenario.apply(pendulum)
+            pendulums += scenario_pendulums
+        neural_nets = neural_nets * len(scenarios)
+    impulses = impulse_schedule(scenarios) if scenarios is not None else {}
+    fitnesses = [0] * len(pendulums)
+    if timing:
+        phase_profiler.add("setup", perf_counter() - t0)
+        t0 = perf_counter()
+    if BATCH_NETWORKS:
+        batched_net = BatchedFeedForwardNetwork.from_networks(neural_nets, config)
+    if timing:
+        phase_profiler.add("network creation", perf_counter() - t0)
+        phase_times = dict.fromkeys(("sensors", "activation", "pivot update", "fitness", "space.step", "rendering"), 0.0)
+
+    dt = 1 / CONTROL_RATE
 
     number_of_steps = int(total_sim_time / dt)  # Total number of steps
+    active = list(range(len(pendulums))) # Indices of the genomes still being simulated
+
+    if viewer is not None:
+        viewer.start_episode(len(pendulums))
+
+    for step in range(number_of_steps):
+        for s, velocity_change in impulses.get(step, ()):
+            for pendulum in pendulums[s * population_size:(s + 1) * population_size]:
+                pendulum.bob_body.velocity += (velocity_change, 0)
+
+        if BATCH_NETWORKS:
+            if timing:
+                t0 = perf_counter()
+            sensory_data = Pendulum.get_sensory_data_batch([pendulums[i] for i in active])
+            if timing:
+                t1 = perf_counter()
+                phase_times["sensors"] += t1 - t0
+            move_speeds = (batched_net.activate(sensory_data)[:, 0] * 5).tolist()
+            if timing:
+                phase_times["activation"] += perf_counter() - t1
 
-    for _ in range(number_of_steps):
-        if DRAW:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    import sys
-                    sys.exit(0)
-                
         pendulum: Pendulum
-        for i, pendulum in enumerate(pendulums):
+        for slot, i in enumerate(active):
+            pendulum = pendulums[i]
+            if timing:
+                t0 = perf_counter()
             # Take action:
-            neural_net_outputs = neural_nets[i].activate(pendulum.get_sensory_data())
-            move_speed = neural_net_outputs[0] * 5  # Speed at which the pendulum pivot moves
+            if BATCH_NETWORKS:
+                move_speed = move_speeds[slot]
+            else:
+                sensory_data = pendulum.get_sensory_data()
+                if timing:
+                    t1 = perf_counter()
+                    phase_times["sensors"] += t1 - t0
+                    t0 = t1
+                neural_net_outputs = neural_nets[i].activate(sensory_data)
+                move_speed = neural_net_outputs[0] * 5  # Speed at which the pendulum pivot moves
+                if timing:
+                    t1 = perf_counter()
+                    phase_times["activation"] += t1 - t0
+                    t0 = t1
 
             pendulum.pivot_body.velocity = (move_speed, 0)
             pendulum.pivot_body.position = (
                 max(WIDTH/6, min(WIDTH - WIDTH/6, pendulum.pivot_body.position.x + move_speed)),
                 pendulum.pivot_body.position.y
             )
+            if timing:
+                t1 = perf_counter()
+                phase_times["pivot update"] += t1 - t0
+                t0 = t1
 
             # Adjust fitness: (should be after step?)
             # Threshold height (9/10 of pendulum length from anchor)
@@ -80,40 +221,388 @@ def fitness_function(population, config):
             # Check if pendulum is above threshold
             if pendulum.bob_body.position.y < threshold_height:
                 center_coeff = 1 - (1 - pendulum.pivot_body.position.x / (WIDTH/2)) ** 2 # Incentive to move towards the center, between 0 and 1
-                genomes[i].fitness += dt * center_coeff # Incentive to balance the pendulum inverted
+                fitnesses[i] += dt * center_coeff # Incentive to balance the pendulum inverted
             # find and display best member?
+            if timing:
+                phase_times["fitness"] += perf_counter() - t0
 
-        space.step(dt)
+        if race is not None:
+            losers = race.losers(step, fitnesses)
+            if losers:
+                for i in losers:
+                    space.remove(*pendulums[i].everything_in_space)
+                active = [i for i in active if i in race.active]
+                if BATCH_NETWORKS:
+                    batched_net = BatchedFeedForwardNetwork.from_networks([neural_nets[i] for i in active], config)
 
-        if DRAW:
-            window.fill((240, 240, 240))  # Light gray background
-            space.debug_draw(draw_options)
+        if timing:
+            t0 = perf_counter()
+        for scenario_space in spaces:
+            step_physics(scenario_space, dt, physics_substeps)
+        if timing:
+            t1 = perf_counter()
+            phase_times["space.step"] += t1 - t0
 
-            text_surface = generation_font.render(f"Generation: {generation}", True, (0, 0, 0))
-            window.blit(text_surface, (10, 10))
+        if viewer is not None and viewer.frame_due():
+            shown = viewer.select(fitnesses, active)
+            viewer.send(generation, step, [pendulums[i].pivot_body.position.x for i in shown],
+                        [pendulums[i].bob_body.position for i in shown], [fitnesses[i] for i in shown])
+            if timing:
+                phase_times["rendering"] += perf_counter() - t1
 
-            pygame.display.update()
-            # clock.tick(fps) # Remove this for fast training
+    if timing:
+        for phase, seconds in phase_times.items():
+            phase_profiler.add(phase, seconds)
+        t0 = perf_counter()
+    if scenarios is None:
+        release_pendulums(space, [pendulums[i] for i in active])
+    else:
+        for s, scenario_space in enumerate(spaces):
+            release_pendulums(scenario_space, pendulums[s * population_size:(s + 1) * population_size])
+    if timing:
+        phase_profiler.add("teardown", perf_counter() - t0)
 
-    for i, pendulum in enumerate(pendulums):
-        space.remove(*pendulum.everything_in_space)
-    # pygame.quit()
+    if scenarios is None:
+        return fitnesses
+    return aggregate(np.reshape(fitnesses, (len(scenarios), population_size)), scenario_aggregation, scenario_quantile)
+
+def simulate_batch(genomes, config, neural_nets):
+    """
+    Same episode as `simulate`, stepped for the whole population at once with a `PendulumBatch` instead of pymunk.
+    """
+    timing = phase_profiler is not None
+    if timing:
+        t0 = perf_counter()
+    scenarios = episode_scenarios()
+    population_size = len(genomes)
+    if scenarios is not None:
+        neural_nets = neural_nets * len(scenarios)
+    pendulums = PendulumBatch(len(neural_nets))
+    if scenarios is not None:
+        for s, scenario in enumerate(scenarios):
+            scenario.apply_batch(pendulums, slice(s * population_size, (s + 1) * population_size))
+    impulses = impulse_schedule(scenarios) if scenarios is not None else {}
+    fitnesses = np.zeros(pendulums.count)
+    if timing:
+        phase_profiler.add("setup", perf_counter() - t0)
+        t0 = perf_counter()
+    if BATCH_NETWORKS:
+        batched_net = BatchedFeedForwardNetwork.from_networks(neural_nets, config)
+    if timing:
+        phase_profiler.add("network creation", perf_counter() - t0)
+        phase_times = dict.fromkeys(("sensors", "activation", "pivot update", "fitness", "space.step", "rendering"), 0.0)
+
+    dt = 1 / CONTROL_RATE
+
+    number_of_steps = int(total_sim_time / dt)  # Total number of steps
+    threshold_height = pendulums.pivot_y - 0.9 * pendulums.pendulum_length
+    if viewer is not None:
+        viewer.start_episode(pendulums.count)
+
+    for step in range(number_of_steps):
+        for s, velocity_change in impulses.get(step, ()):
+            pendulums.bob_velocity[s * population_size:(s + 1) * population_size, 0] += velocity_change
+
+        if timing:
+            t0 = perf_counter()
+        sensory_data = pendulums.get_sensory_data()
+        if timing:
+            t1 = perf_counter()
+            phase_times["sensors"] += t1 - t0
+        if BATCH_NETWORKS:
+            move_speed = batched_net.activate(sensory_data)[:, 0] * 5
+        else:
+            move_speed = np.array([net.activate(sensors)[0] for net, sensors in zip(neural_nets, sensory_data.tolist())]) * 5
+        if timing:
+            t0 = perf_counter()
+            phase_times["activation"] += t0 - t1
+        pendulums.move_pivots(move_speed)
+        if timing:
+            t1 = perf_counter()
+            phase_times["pivot update"] += t1 - t0
+
+        center_coeff = 1 - (1 - pendulums.pivot_x / (WIDTH/2)) ** 2
+        fitnesses += np.where(pendulums.bob_position[:, 1] < threshold_height, dt * center_coeff, 0)
+        if timing:
+            t0 = perf_counter()
+            phase_times["fitness"] += t0 - t1
+
+        step_physics(pendulums, dt, physics_substeps)
+        if timing:
+            t1 = perf_counter()
+            phase_times["space.step"] += t1 - t0
+
+        if viewer is not None and viewer.frame_due():
+            shown = viewer.select(fitnesses, range(pendulums.count))
+            viewer.send(generation, step, pendulums.pivot_x[shown], pendulums.bob_position[shown], fitnesses[shown])
+            if timing:
+                phase_times["rendering"] += perf_counter() - t1
+
+    if timing:
+        for phase, seconds in phase_times.items():
+            phase_profiler.add(phase, seconds)
+    if scenarios is None:
+        return fitnesses.tolist()
+    return aggregate(fitnesses.reshape(len(scenarios), population_size), scenario_aggregation, scenario_quantile)
+
+def new_race(genomes, config, protection):
+    """A `Race` over one episode of `simulate` for `genomes`."""
+    dt = 1 / CONTROL_RATE
+    return Race(genomes, protection, config.fitness_threshold, int(total_sim_time / dt), dt)
+
+def _sim_settings():
+    """The module-level settings a worker process needs to reproduce the serial simulation."""
+    return {"total_sim_time": total_sim_time, "BACKEND": BACKEND, "BATCH_NETWORKS": BATCH_NETWORKS,
+            "PENDULUM_POOL": PENDULUM_POOL, "PHYSICS_LITE": PHYSICS_LITE, "solver_iterations": solver_iterations,
+            "scenario_count": scenario_count, "scenario_aggregation": scenario_aggregation,
+            "scenario_quantile": scenario_quantile, "scenario_seed": scenario_seed,
+            "physics_substeps": physics_substeps}
+
+def _init_worker(worker_config, settings):
+    """Pool initializer: every worker keeps its own config, settings and physics space."""
+    global _worker_config
+    _worker_config = worker_config
+    globals().update(settings)
+    reset_spaces()
+
+def reset_spaces():
+    """New physics spaces, with the current `solver_iterations`, and empty pendulum pools."""
+    global space, pendulum_pools, scenario_spaces
+    pendulum_pools = {}
+    scenario_spaces = []
+    space = make_space(solver_iterations)
+
+def _evaluate_shard(shard):
+    """
+    Evaluates one shard of the population inside a worker process. Only the fitness values are sent back,
+    with the indices of the genomes dropped and the steps saved when the shard is raced.
+    """
+    genomes, protection = shard
+    race = None if protection is None else new_race(genomes, _worker_config, protection)
+    fitnesses = simulate(genomes, _worker_config, space, race)
+    if race is None:
+        return fitnesses, [], 0
+    return fitnesses, sorted(set(range(len(genomes))) - race.active), race.steps_saved
+
+def start_workers(config, workers):
+    """Starts the process pool used by `fitness_function`. With `workers <= 1` evaluation stays in this process."""
+    global worker_pool, worker_pool_size
+    stop_workers()
+    if workers > 1:
+        worker_pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(config, _sim_settings()))
+        worker_pool_size = workers
+
+def stop_workers():
+    global worker_pool
+    if worker_pool is not None:
+        worker_pool.close()
+        worker_pool.join()
+        worker_pool = None
+
+def evaluate_in_parallel(genomes, workers, protection=None):
+    """
+    Splits `genomes` into `workers` contiguous shards, evaluates them on the pool and returns the fitness values in order,
+    with the indices of the genomes that were raced out.
+    With a `protection` map from `RacingReporter`, every shard is raced and the results are recorded on `racing`.
+    """
+    shard_size, remainder = divmod(len(genomes), workers)
+    shards = []
+    start = 0
+    for w in range(workers):
+        end = start + shard_size + (1 if w < remainder else 0)
+        if end > start:
+            shards.append((genomes[start:end], protection))
+        start = end
+
+    fitnesses = []
+    dropped = []
+    for shard_fitnesses, shard_dropped, steps_saved in worker_pool.map(_evaluate_shard, shards):
+        dropped.extend(len(fitnesses) + i for i in shard_dropped)
+        fitnesses.extend(shard_fitnesses)
+        if protection is not None:
+            racing.record(len(shard_dropped), steps_saved, len(shard_fitnesses) * int(total_sim_time / (1 / CONTROL_RATE)))
+    return fitnesses, dropped
+
+def evaluate(genomes, config, neural_nets=None):
+    """
+    Evaluates `genomes` in this process, on the worker pool or on the remote workers, raced when racing is on
+    (except remotely). Returns their fitness values in order and the indices of the genomes that were raced out.
+    """
+    global simulated_steps
+    steps_saved = racing.steps_saved if racing is not None else 0
+    fitnesses, dropped = _dispatch(genomes, config, neural_nets)
+    if racing is not None:
+        steps_saved = racing.steps_saved - steps_saved
+    simulated_steps += len(genomes) * int(total_sim_time / (1 / CONTROL_RATE)) * max(scenario_count, 1) - steps_saved
+    return fitnesses, dropped
+
+def _dispatch(genomes, config, neural_nets=None):
+    if remote_evaluator is not None and viewer is None:
+        return remote_evaluator.evaluate(genomes), []
+    protection = racing.protection if racing is not None and BACKEND == "pymunk" and scenario_count <= 1 else None
+    if worker_pool is not None and viewer is None:
+        return evaluate_in_parallel(genomes, worker_pool_size, protection)
+    if protection is not None:
+        race = new_race(genomes, config, protection)
+        fitnesses = simulate(genomes, config, space, race, neural_nets)
+        racing.record(race.dropped, race.steps_saved, len(genomes) * race.number_of_steps)
+        return fitnesses, sorted(set(range(len(genomes))) - race.active)
+    return simulate(genomes, config, space, neural_nets=neural_nets), []
+
+def fitness_function(population, config):
+    """
+    This function is solely for the use of the python NEAT library.
+
+    Arguments:
+        - The population as a list of (genome id, genome) tuples.
+        - The current configuration object.
+
+    The return value of the fitness function is ignored, but it must assign a Python float to the fitness member of each genome.
+    The fitness function is free to maintain external state, perform evaluations in parallel, etc.
+    It is assumed that fitness_function does not modify the list of genomes, the genomes themselves (apart from updating the fitness member), or the configuration object.
+    """
+    global generation
+    generation += 1
+
+    genomes = [genome for genome_id, genome in population]
+    if genome_cache is None:
+        fitnesses, dropped = evaluate(genomes, config)
+        for genome, fitness in zip(genomes, fitnesses):
+            genome.fitness = fitness
+        return
+
+    # Only simulate the genomes whose content has not been evaluated before
+    timing = phase_profiler is not None
+    if timing:
+        t0 = perf_counter()
+    settings = _sim_settings()
+    unknown = []
+    unknown_keys = []
+    for genome in genomes:
+        key = GenomeCache.genome_key(genome, settings)
+        genome.fitness = genome_cache.fitness(key)
+        if genome.fitness is None:
+            unknown.append(genome)
+            unknown_keys.append(key)
+
+    neural_nets = None
+    if unknown and worker_pool is None and remote_evaluator is None:
+        neural_nets = [genome_cache.network(key) or neat.nn.FeedForwardNetwork.create(genome, config)
+                       for genome, key in zip(unknown, unknown_keys)]
+    if timing:
+        phase_profiler.add("network creation", perf_counter() - t0)  # With the cache lookups
+    if not unknown:
+        return
+    fitnesses, dropped = evaluate(unknown, config, neural_nets)
+
+    # Raced out genomes only have a lower bound of their fitness, it must not be reused
+    dropped = set(dropped)
+    for i, (genome, key, fitness) in enumerate(zip(unknown, unknown_keys, fitnesses)):
+        genome.fitness = fitness
+        genome_cache.store(key, None if i in dropped else fitness, None if neural_nets is None else neural_nets[i])
+
+def run(config_path, save_path, workers=None, checkpoint_path=None, resume=False, profile_generation=None,
+        trajectory_path=None, listen_address=None, controller_path=None, telemetry_path=None, reporters=()):
+    """
+    Evolves a controller and saves the best genome to `save_path`.
+    With `checkpoint_path`, the whole training state is saved there every `checkpoint_interval` generations, and
+    `resume` continues the run saved in that checkpoint exactly as if it had never stopped.
+    With `PROFILE` on, every generation prints a breakdown of its evaluation time, and `profile_generation` is run under cProfile.
+    With `RECORD_TRAJECTORIES` on, an episode of every generation's best genome is appended to the log at `trajectory_path`.
+    With a `listen_address` (host, port), genomes are evaluated by the `distributed.py` workers that connect to it.
+    With `island_count` above 1, the training runs as an island model (see `islands.py`) and the options above only
+    apply to the single population mode.
+    With a `controller_path`, the saved genome is also exported there as a standalone controller for `AI_control.py`.
+    The best genome so far is saved, and exported, whenever a generation improves on it, not only at the end.
+    With a `time_budget`, generations run until the next one is not expected to finish within that many seconds of
+    the start, or the fitness threshold is reached, instead of for `max_generations`. The time budget and the saves
+    on improvement apply to island runs too.
+    With a `telemetry_path`, a record of every generation is appended to that file (see `telemetry.py`).
+    `reporters` are added to the population after the built-in ones.
+    """
+    global racing, genome_cache, generation, phase_profiler, viewer, remote_evaluator
+    budget = TimeBudget(time_budget, budget_window) if time_budget is not None else None
+    export_controller = None if controller_path is None else lambda path: export(path, config_path, controller_path)
+    if island_count > 1:
+        winner, time_to_threshold = run_islands(config_path, _sim_settings(), island_count, max_generations,
+                                                migration_interval, migrant_count, migration_topology, cache_size,
+                                                save_path=save_path, export=export_controller, budget=budget)
+        print(f"\nBest network of {island_count} islands saved to '{os.path.basename(save_path)}'")
+        print(f"Final fitness: {winner.fitness}")
+        if time_to_threshold is not None:
+            print(f"Fitness threshold reached after {time_to_threshold:.1f} sec")
+        return
 
-def run(config_path, save_path):
     config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
                                 neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+    reset_spaces()
 
-    population = neat.Population(config)
+    if resume:
+        population, extra_state = restore_population(checkpoint_path, config)
+        generation = extra_state["generation"]
+        print(f"Resuming from generation {population.generation} of '{checkpoint_path}'")
+    else:
+        population = neat.Population(config)
+        generation = 0
     population.add_reporter(neat.StdOutReporter(True))
-    stats = neat.StatisticsReporter()
-    population.add_reporter(stats)
+    best_fitness = population.best_genome.fitness if population.best_genome is not None else None
+    population.add_reporter(BestGenomeExporter(save_path, export_controller, best_fitness))
+    telemetry = TelemetryReporter(telemetry_path, lambda: simulated_steps) if telemetry_path is not None else None
+    if telemetry is not None:
+        population.add_reporter(telemetry)
+    racing = RacingReporter(population.species, config.reproduction_config) if RACING else None
+    if racing is not None:
+        population.add_reporter(racing)
+    genome_cache = GenomeCache(cache_size) if cache_size > 0 else None
+    if genome_cache is not None:
+        population.add_reporter(genome_cache)
+    phase_profiler = PhaseProfiler(profile_generation) if PROFILE or profile_generation is not None else None
+    if phase_profiler is not None:
+        population.add_reporter(phase_profiler)
+    if RECORD_TRAJECTORIES:
+        population.add_reporter(TrajectoryRecorder(trajectory_path, int(total_sim_time / (1 / CONTROL_RATE)), physics_substeps,
+                                                   solver_iterations, not PHYSICS_LITE, BACKEND))
+
+    checkpointer = None
+    if checkpoint_path is not None:
+        checkpointer = Checkpointer(population, checkpoint_path, checkpoint_interval,
+                                    extra_state=lambda: {"generation": generation})
+        population.add_reporter(checkpointer)
+    for reporter in reporters:
+        population.add_reporter(reporter)
 
+    if listen_address is not None:
+        remote_evaluator = RemoteEvaluator(listen_address, config, config_digest(config_path), _sim_settings(),
+                                           remote_batch_size, remote_timeout)
+    else:
+        start_workers(config, num_workers if workers is None else workers)
+    viewer = TrainingViewer(viewer_fps, viewer_genomes, viewer_selection) if DRAW else None
     winner: neat.DefaultGenome
-    winner = population.run(fitness_function, max_generations)
+    try:
+        if budget is not None:
+            winner = run_until_deadline(population, fitness_function, budget)
+        else:
+            winner = population.run(fitness_function, max_generations - population.generation)
+    finally:
+        stop_workers()
+        if remote_evaluator is not None:
+            remote_evaluator.close()
+            remote_evaluator = None
+        if viewer is not None:
+            viewer.close()
+            viewer = None
+        # Both raise the error of a failed write, the checkpoint must still be written if the telemetry failed
+        try:
+            if telemetry is not None:
+                telemetry.close()
+        finally:
+            if checkpointer is not None:
+                checkpointer.close()
     
     # Save the winner genome to disk
-    with open(save_path, 'wb') as output:
-        pickle.dump(winner, output, 1)
+    write_atomically(save_path, pickle.dumps(winner, 1))
+    if controller_path is not None:
+        export(save_path, config_path, controller_path)
     
     print(f"\nBest network saved to 'best_network.pkl'")
     print(f"Final fitness: {winner.fitness}")
@@ -122,4 +611,99 @@ if __name__ == "__main__":
     local_dir = os.path.dirname(__file__)
     config_path = os.path.join(local_dir, 'neat_config.txt')
     save_path = os.path.join(local_dir, 'best_network.pkl')
-    run(config_path, save_path)
\ No newline at end of file
+    checkpoint_path = os.path.join(local_dir, 'training_checkpoint.ckpt')
+    trajectory_path = os.path.join(local_dir, 'trajectories')
+    telemetry_path = os.path.join(local_dir, 'telemetry.jsonl')
+    controller_path = os.path.join(local_dir, 'best_controller.py')
+
+    parser = argparse.ArgumentParser(description="Evolve a pendulum controller with NEAT")
+    parser.add_argument("--time-budget", type=float, default=time_budget, metavar="SECONDS",
+                        help="train until the next generation would not finish within SECONDS of the start, "
+                             "instead of for a fixed number of generations")
+    parser.add_argument("--backend", choices=["pymunk", "numpy"], default=BACKEND,
+                        help="physics used to evaluate genomes (default: %(default)s)")
+    parser.add_argument("--batch-networks", action="store_true", default=BATCH_NETWORKS,
+                        help="activate all networks of a generation at once with NumPy")
+    parser.add_argument("--racing", action="store_true", default=RACING,
+                        help="stop simulating genomes that can no longer survive or reach the fitness threshold; "
+                             "their partial fitness changes how many offspring each species gets")
+    parser.add_argument("--cache-size", type=int, default=cache_size,
+                        help="genomes kept in the fitness cache, 0 disables it (default: %(default)s)")
+    parser.add_argument("--draw", action="store_true", default=DRAW,
+                        help="watch the best genomes live in a separate window (evaluation stays in this process)")
+    parser.add_argument("--record", action="store_true", default=RECORD_TRAJECTORIES,
+                        help="record an episode of every generation's best genome for replay.py")
+    parser.add_argument("--no-pendulum-pool", dest="pendulum_pool", action="store_false", default=PENDULUM_POOL,
+                        help="create new pendulums every generation instead of resetting pooled ones")
+    parser.add_argument("--no-physics-lite", dest="physics_lite", action="store_false", default=PHYSICS_LITE,
+                        help="give the training pendulums collision shapes, as in the interactive modes")
+    parser.add_argument("--solver-iterations", type=int, default=solver_iterations, metavar="N",
+                        help="solver iterations of the training spaces, 1 is faster but not bit-identical (default: %(default)s)")
+    parser.add_argument("--scenarios", type=int, default=scenario_count, metavar="N",
+                        help="score every genome on N perturbed start states in one pass (default: %(default)s)")
+    parser.add_argument("--scenario-aggregation", choices=AGGREGATIONS, default=scenario_aggregation,
+                        help="how the fitness values of the scenarios combine (default: %(default)s)")
+    parser.add_argument("--scenario-quantile", type=float, default=scenario_quantile,
+                        help="quantile used by --scenario-aggregation quantile (default: %(default)s)")
+    parser.add_argument("--scenario-seed", type=int, default=scenario_seed,
+                        help="seed of the scenarios (default: %(default)s)")
+    parser.add_argument("--substeps", type=int, default=physics_substeps, metavar="N",
+                        help="physics steps per control tick, the AI control mode needs the same (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=num_workers,
+                        help="number of processes evaluating genomes (default: %(default)s)")
+    parser.add_argument("--islands", type=int, default=island_count, metavar="K",
+                        help="evolve K populations in parallel processes that exchange genomes (default: %(default)s)")
+    parser.add_argument("--migration-interval", type=int, default=migration_interval,
+                        help="generations between two migrations between islands (default: %(default)s)")
+    parser.add_argument("--migrants", type=int, default=migrant_count,
+                        help="fittest genomes an island sends to each neighbour (default: %(default)s)")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default=migration_topology,
+                        help="islands that receive an island's migrants (default: %(default)s)")
+    parser.add_argument("--listen", metavar="HOST:PORT",
+                        help="evaluate on the 'distributed.py --connect HOST:PORT' workers instead of locally")
+    parser.add_argument("--remote-batch-size", type=int, default=remote_batch_size,
+                        help="genomes sent to a remote worker at a time (default: %(default)s)")
+    parser.add_argument("--remote-timeout", type=float, default=remote_timeout,
+                        help="seconds before a silent remote worker's batch is re-queued (default: %(default)s)")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help=f"save the training state to {os.path.basename(checkpoint_path)} during the run")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the run saved in the checkpoint (implies --checkpoint)")
+    parser.add_argument("--profile", action="store_true", default=PROFILE,
+                        help="print the evaluation time of every generation split into simulation phases")
+    parser.add_argument("--profile-generation", type=int, metavar="N",
+                        help="also run generation N under cProfile and save the statistics to training.pstats")
+    parser.add_argument("--telemetry", nargs="?", const=telemetry_path, metavar="PATH",
+                        help="append a record of every generation to PATH (default: telemetry.jsonl), see telemetry.py")
+    args = parser.parse_args()
+    if args.islands > 1 and (args.checkpoint or args.resume):
+        parser.error("--checkpoint and --resume only apply to a single population, not to --islands")
+    if args.resume and not os.path.exists(checkpoint_path):
+        parser.error(f"--resume: no checkpoint at '{checkpoint_path}', train with --checkpoint first")
+    time_budget = args.time_budget
+    BACKEND = args.backend
+    BATCH_NETWORKS = args.batch_networks
+    RACING = args.racing
+    cache_size = args.cache_size
+    PROFILE = args.profile
+    DRAW = args.draw
+    RECORD_TRAJECTORIES = args.record
+    PENDULUM_POOL = args.pendulum_pool
+    PHYSICS_LITE = args.physics_lite
+    solver_iterations = args.solver_iterations
+    scenario_count = args.scenarios
+    scenario_aggregation = args.scenario_aggregation
+    scenario_quantile = args.scenario_quantile
+    scenario_seed = args.scenario_seed
+    physics_substeps = args.substeps
+    island_count = args.islands
+    migration_interval = args.migration_interval
+    migrant_count = args.migrants
+    migration_topology = args.topology
+    remote_batch_size = args.remote_batch_size
+    remote_timeout = args.remote_timeout
+
+    run(config_path, save_path, workers=args.workers,
+        checkpoint_path=checkpoint_path if args.checkpoint or args.resume else None, resume=args.resume,
+        profile_generation=args.profile_generation, trajectory_path=trajectory_path, telemetry_path=args.telemetry,
+        listen_address=parse_address(args.listen) if args.listen else None, controller_path=controller_path)
\ No newline at end of file
@@ -0,0 +1,196 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+import neat
+from commons import CONTROL_RATE, PHYSICS_SUBSTEPS, SOLVER_ITERATIONS, Pendulum, PendulumBatch, WIDTH, make_space, step_physics
+
+# One row per control step: the sensors and network output of the step, then the state after the physics step
+COLUMNS = (
+    ("step", np.int32),
+    ("pivot_x", np.float32),
+    ("bob_x", np.float32),
+    ("bob_y", np.float32),
+    ("bob_vx", np.float32),
+    ("bob_vy", np.float32),
+    ("sensor_pivot_x", np.float32),
+    ("sensor_angle", np.float32),
+    ("sensor_angular_velocity", np.float32),
+    ("output", np.float32),
+)
+FORMAT_VERSION = 1
+LOCK_TIMEOUT = 30  # Seconds after which a lock is taken to be left behind by a writer that crashed holding it
+
+def _column_path(directory, name):
+    return os.path.join(directory, name + ".bin")
+
+def _read_meta(directory):
+    with open(os.path.join(directory, "meta.json")) as input_file:
+        meta = json.load(input_file)
+    if meta["version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported trajectory log version {meta['version']}, expected {FORMAT_VERSION}")
+    return meta
+
+@contextmanager
+def _locked(directory, timeout=LOCK_TIMEOUT):
+    """Exclusive access to the log at `directory`, held by creating its `lock` file."""
+    path = os.path.join(directory, "lock")
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > timeout:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.remove(path)
+
+class TrajectoryWriter:
+    """
+    Appends episodes to a columnar trajectory log: a directory with one raw binary file per column of `COLUMNS`
+    and a `meta.json` holding the row count and the episode table. Rows are buffered until `end_episode`, which
+    appends them to the column files before updating `meta.json` (atomically), so readers only ever see complete
+    episodes. Several writers can share a log (training and AI control both record to the default one):
+    `end_episode` holds the log's lock file and reads `meta.json` afresh, so every episode goes after the last one
+    written by any of them.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.rows = None
+        self.episode = None
+
+    def begin_episode(self, source, generation=None, fitness=None):
+        self.rows = []
+        self.episode = {"source": source, "generation": generation, "fitness": fitness}
+
+    def append(self, step, pendulum, sensory_data, output):
+        """Adds the row of one control step of `pendulum`, a `commons.Pendulum`."""
+        self.append_state(step, pendulum.pivot_body.position.x, pendulum.bob_body.position,
+                          pendulum.bob_body.velocity, sensory_data, output)
+
+    def append_state(self, step, pivot_x, bob_position, bob_velocity, sensory_data, output):
+        """Adds the row of one control step from the state itself, for pendulums that are not `commons.Pendulum`s."""
+        self.rows.append((step, pivot_x, *bob_position, *bob_velocity, *sensory_data, output))
+
+    def end_episode(self):
+        if not self.rows:
+            return
+        columns = list(zip(*self.rows))
+        with _locked(self.directory):
+            if os.path.exists(os.path.join(self.directory, "meta.json")):
+                meta = _read_meta(self.directory)
+            else:
+                meta = {"version": FORMAT_VERSION, "columns": [name for name, dtype in COLUMNS], "rows": 0, "episodes": []}
+            for (name, dtype), values in zip(COLUMNS, columns):
+                with open(_column_path(self.directory, name), 'ab') as column_file:
+                    # Drop rows a crashed writer appended without recording their episode
+                    column_file.truncate(meta["rows"] * np.dtype(dtype).itemsize)
+                    np.asarray(values, dtype=dtype).tofile(column_file)
+
+            self.episode.update(start=meta["rows"], length=len(self.rows))
+            meta["episodes"].append(self.episode)
+            meta["rows"] += len(self.rows)
+            temporary_path = os.path.join(self.directory, "meta.json.tmp")
+            with open(temporary_path, "w") as output:
+                json.dump(meta, output)
+            os.replace(temporary_path, os.path.join(self.directory, "meta.json"))
+        self.rows = None
+
+class TrajectoryLog:
+    """
+    Read-only, memory-mapped view of a trajectory log. Every column is a `np.memmap` over its file, and the columns
+    of an episode are slices of those, so nothing is copied or recomputed. `refresh` picks up episodes appended
+    since the log was opened.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.refresh()
+
+    def refresh(self):
+        self.meta = _read_meta(self.directory)
+        self.episodes = self.meta["episodes"]
+        rows = self.meta["rows"]
+        self.columns = {}
+        for name, dtype in COLUMNS:
+            if rows == 0:
+                self.columns[name] = np.zeros(0, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(_column_path(self.directory, name), dtype=dtype, mode="r", shape=(rows,))
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def episode(self, index):
+        """The episode at `index` (negative counts from the end) and a dict of zero-copy views of its columns."""
+        episode = self.episodes[index]
+        start = episode["start"]
+        end = start + episode["length"]
+        return episode, {name: column[start:end] for name, column in self.columns.items()}
+
+def record_episode(network, writer, number_of_steps, source, generation=None, fitness=None, substeps=PHYSICS_SUBSTEPS,
+                   iterations=SOLVER_ITERATIONS, collision_shape=True, backend="pymunk"):
+    """
+    Runs `network` on one pendulum, with the same control loop as training, and appends the episode to `writer`.
+    The physics settings are those of training (`train.solver_iterations`, `train.PHYSICS_LITE`, `train.BACKEND`), so
+    the episode is the unperturbed one the genome was scored on.
+    """
+    dt = 1 / CONTROL_RATE
+    writer.begin_episode(source, generation, fitness)
+    if backend == "numpy":
+        pendulums = PendulumBatch(1)
+        for step in range(number_of_steps):
+            sensory_data = pendulums.get_sensory_data()[0].tolist()
+            output = network.activate(sensory_data)[0]
+            pendulums.move_pivots(np.array([output * 5]))
+            step_physics(pendulums, dt, substeps)
+            writer.append_state(step, pendulums.pivot_x[0], pendulums.bob_position[0], pendulums.bob_velocity[0],
+                                sensory_data, output)
+        writer.end_episode()
+        return
+
+    space = make_space(iterations)
+    pendulum = Pendulum(space, collision_shape)
+    for step in range(number_of_steps):
+        sensory_data = pendulum.get_sensory_data()
+        output = network.activate(sensory_data)[0]
+        move_speed = output * 5
+        pendulum.pivot_body.velocity = (move_speed, 0)
+        pendulum.pivot_body.position = (
+            max(WIDTH/6, min(WIDTH - WIDTH/6, pendulum.pivot_body.position.x + move_speed)),
+            pendulum.pivot_body.position.y
+        )
+        step_physics(space, dt, substeps)
+        writer.append(step, pendulum, sensory_data, output)
+    writer.end_episode()
+
+class TrajectoryRecorder(neat.reporting.BaseReporter):
+    """
+    Records one episode of the best genome of every generation, which costs a single pendulum's simulation.
+    The physics settings are passed on to `record_episode`.
+    """
+    def __init__(self, directory, number_of_steps, substeps=PHYSICS_SUBSTEPS, iterations=SOLVER_ITERATIONS,
+                 collision_shape=True, backend="pymunk"):
+        self.writer = TrajectoryWriter(directory)
+        self.number_of_steps = number_of_steps
+        self.substeps = substeps
+        self.iterations = iterations
+        self.collision_shape = collision_shape
+        self.backend = backend
+        self.generation = None
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        network = neat.nn.FeedForwardNetwork.create(best_genome, config)
+        record_episode(network, self.writer, self.number_of_steps, "train", self.generation, best_genome.fitness,
+                       self.substeps, self.iterations, self.collision_shape, self.backend)
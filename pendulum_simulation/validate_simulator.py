@@ -0,0 +1,100 @@
+"""
+Compares the NumPy `PendulumBatch` simulator against the pymunk `Pendulum` it replaces during training.
+
+Both backends are driven with the same controllers for the same number of steps. By default the controllers are
+the networks of a freshly created population (random weights, so plenty of swinging); with --network the saved
+best network controls every pendulum instead. Reports how far the bob positions, sensor values and fitness
+values drift apart.
+"""
+import argparse
+import os
+import pickle
+import random
+import numpy as np
+import pymunk
+import neat
+import train
+from commons import Pendulum, PendulumBatch, WIDTH
+
+def run_pymunk(neural_nets, number_of_steps, dt):
+    space = pymunk.Space()
+    space.gravity = (0, 981)
+    pendulums = [Pendulum(space) for _ in neural_nets]
+
+    positions = np.empty((number_of_steps, len(pendulums), 2))
+    sensors = np.empty((number_of_steps, len(pendulums), 3))
+    for step in range(number_of_steps):
+        for i, pendulum in enumerate(pendulums):
+            sensors[step, i] = pendulum.get_sensory_data()
+            move_speed = neural_nets[i].activate(sensors[step, i].tolist())[0] * 5
+            pendulum.pivot_body.velocity = (move_speed, 0)
+            pendulum.pivot_body.position = (
+                max(WIDTH/6, min(WIDTH - WIDTH/6, pendulum.pivot_body.position.x + move_speed)),
+                pendulum.pivot_body.position.y
+            )
+        space.step(dt)
+        for i, pendulum in enumerate(pendulums):
+            positions[step, i] = pendulum.bob_body.position
+    return positions, sensors
+
+def run_numpy(neural_nets, number_of_steps, dt):
+    pendulums = PendulumBatch(len(neural_nets))
+
+    positions = np.empty((number_of_steps, len(neural_nets), 2))
+    sensors = np.empty((number_of_steps, len(neural_nets), 3))
+    for step in range(number_of_steps):
+        sensors[step] = pendulums.get_sensory_data()
+        move_speed = np.array([net.activate(s)[0] for net, s in zip(neural_nets, sensors[step].tolist())]) * 5
+        pendulums.move_pivots(move_speed)
+        pendulums.step(dt)
+        positions[step] = pendulums.bob_position
+    return positions, sensors
+
+def main():
+    local_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Measure the drift of the NumPy simulator from the pymunk reference")
+    parser.add_argument("--genomes", type=int, default=20, help="number of random genomes to compare (default: %(default)s)")
+    parser.add_argument("--seconds", type=float, default=25, help="simulated time per episode (default: %(default)s)")
+    parser.add_argument("--network", action="store_true", help="use best_network.pkl instead of random genomes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                                neat.DefaultSpeciesSet, neat.DefaultStagnation, os.path.join(local_dir, 'neat_config.txt'))
+    if args.network:
+        with open(os.path.join(local_dir, 'best_network.pkl'), 'rb') as input_file:
+            genomes = [pickle.load(input_file)]
+    else:
+        genomes = list(neat.Population(config).population.values())[:args.genomes]
+    neural_nets = [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+
+    dt = 1 / 60
+    number_of_steps = int(args.seconds / dt)
+    reference_positions, reference_sensors = run_pymunk(neural_nets, number_of_steps, dt)
+    positions, sensors = run_numpy(neural_nets, number_of_steps, dt)
+
+    position_error = np.linalg.norm(positions - reference_positions, axis=2)
+    sensor_error = sensors - reference_sensors
+    # The angle sensor is an angle over pi: -1 and 1 are the same direction, the drift must go around the circle
+    sensor_error[:, :, 1] = (sensor_error[:, :, 1] + 1) % 2 - 1
+    sensor_error = np.abs(sensor_error)
+    print(f"Compared {len(genomes)} controllers over {number_of_steps} steps")
+    print(f"Bob position drift (px): max={position_error.max():.3e} mean={position_error.mean():.3e}")
+    for second in (1, 5, 10, 25):
+        step = int(second / dt) - 1
+        if step < number_of_steps:
+            print(f"    after {second:>2} s: max={position_error[:step + 1].max():.3e}")
+    for column, name in enumerate(["pivot x", "angle", "angular velocity"]):
+        print(f"Sensor drift ({name}): max={sensor_error[:, :, column].max():.3e}")
+
+    # Fitness of the same genomes through both training backends
+    train.total_sim_time = args.seconds
+    train.BACKEND = "pymunk"
+    reference_fitness = np.array(train.simulate(genomes, config, train.space))
+    train.BACKEND = "numpy"
+    fitness_error = np.abs(np.array(train.simulate(genomes, config, train.space)) - reference_fitness)
+    print(f"Fitness drift: max={fitness_error.max():.3e} (best reference fitness {reference_fitness.max():.3f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import multiprocessing
+import queue
+import random
+from time import perf_counter
+from commons import CONTROL_RATE, WIDTH, HEIGHT, draw_pendulum
+
+class TrainingViewer:
+    """
+    Live view of training that renders in its own process.
+
+    The trainer only sends small frames (pivot x and bob position of a few pendulums, plus their fitness so far),
+    at most `max_fps` times per second of wall time. Frames go through a queue of two, and a frame that does not
+    fit is dropped, so a slow or closed viewer never holds up training. `selection` is "top" to follow the
+    `genome_count` best genomes of the moment, or "sample" for a random subset picked once per episode.
+    """
+    def __init__(self, max_fps=30, genome_count=10, selection="top"):
+        self.max_fps = max_fps
+        self.genome_count = genome_count
+        self.selection = selection
+        self.frames = multiprocessing.Queue(maxsize=2)
+        self.stop = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=_viewer_process, args=(self.frames, self.stop, max_fps), daemon=True)
+        self.process.start()
+        self.last_frame = 0.0
+        self.sample = None
+        self.sent = 0
+        self.dropped = 0
+
+    def start_episode(self, population_size):
+        """Picks the sampled subset for an episode of `population_size` pendulums."""
+        self.sample = sorted(random.Random().sample(range(population_size), min(self.genome_count, population_size)))
+
+    def frame_due(self):
+        """True at most `max_fps` times per second, while the viewer window is open."""
+        now = perf_counter()
+        if now - self.last_frame < 1 / self.max_fps or not self.process.is_alive():
+            return False
+        self.last_frame = now
+        return True
+
+    def select(self, fitnesses, candidates):
+        """The indices among `candidates` to show."""
+        if self.selection == "top":
+            return sorted(candidates, key=lambda i: fitnesses[i], reverse=True)[:self.genome_count]
+        candidates = set(candidates)
+        return [i for i in self.sample if i in candidates]
+
+    def send(self, generation, step, pivot_x, bob_positions, fitnesses):
+        try:
+            self.frames.put_nowait((generation, step, list(pivot_x), [tuple(p) for p in bob_positions], list(fitnesses)))
+            self.sent += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.stop.set()
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.frames.cancel_join_thread()
+
+def _viewer_process(frames, stop, max_fps):
+    import pygame
+
+    pygame.init()
+    window = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Training - Live View")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont("Arial", 24)
+
+    frame = None
+    while not stop.is_set():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+
+        # Only the newest frame matters
+        try:
+            while True:
+                frame = frames.get_nowait()
+        except queue.Empty:
+            pass
+
+        window.fill((240, 240, 240))  # Light gray background
+        if frame is not None:
+            generation, step, pivot_x, bob_positions, fitnesses = frame
+            # Draw the best one last so it stays on top
+            order = sorted(range(len(pivot_x)), key=lambda i: fitnesses[i])
+            for rank, i in enumerate(order):
+                color = (200, 60, 60) if rank == len(order) - 1 else (70, 130, 180)
+                pivot = (pivot_x[i], HEIGHT/2)
+                draw_pendulum(window, pivot, bob_positions[i], color)
+
+            best = max(fitnesses) if fitnesses else 0
+            text = f"Generation: {generation}   Time: {step / CONTROL_RATE:5.1f} s   Showing: {len(pivot_x)}   Best so far: {best:.2f}"
+            window.blit(font.render(text, True, (0, 0, 0)), (10, 10))
+
+        pygame.display.update()
+        clock.tick(max_fps)
+
+    pygame.quit()